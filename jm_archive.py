@@ -0,0 +1,116 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+
+# zstd は zstandard がインストールされている場合のみ使う
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+INDEX_FILENAME = 'index.jsonl'
+
+CODEC_EXTENSIONS = {
+    'gzip': '.html.gz',
+    'zstd': '.html.zst',
+}
+
+
+def default_codec():
+    return 'zstd' if zstandard is not None else 'gzip'
+
+
+class HtmlArchive:
+    """取得した生のレスポンスを圧縮して保存するアーカイブ
+
+    ページごとに圧縮した本文を1ファイルとして保存し、URL・ステータス・
+    文字コードなどのメタデータを index.jsonl に1行ずつ追記する。
+    同じURLを再取得した場合はファイルを上書きし、索引は最後の行が有効になる。
+    """
+
+    def __init__(self, archive_dir, codec=None):
+        codec = codec or default_codec()
+        if codec not in CODEC_EXTENSIONS:
+            raise ValueError(f"未対応の圧縮形式です: {codec}")
+        if codec == 'zstd' and zstandard is None:
+            raise ValueError("zstd を使うには zstandard をインストールしてください。")
+
+        self.archive_dir = archive_dir
+        self.codec = codec
+        self.index_path = os.path.join(archive_dir, INDEX_FILENAME)
+        self._lock = threading.Lock()
+        os.makedirs(archive_dir, exist_ok=True)
+
+    def put(self, url, response, kind='page'):
+        """レスポンスの本文を圧縮して保存し、索引に追記する
+
+        kind には再抽出の方法を決めるページの種類（検索結果の 'page' か、
+        求人1件の詳細ページの 'detail'）を記録する。
+        """
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        filename = key + CODEC_EXTENSIONS[self.codec]
+        path = os.path.join(self.archive_dir, filename)
+
+        data = compress(response.content, self.codec)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        entry = {
+            'url': url,
+            'kind': kind,
+            'file': filename,
+            'codec': self.codec,
+            'status_code': response.status_code,
+            'encoding': response.encoding,
+            'fetched_at': time.time(),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+def read_index(archive_dir):
+    """索引を読み込み、URLごとに最新のエントリを返す"""
+    latest = {}
+    index_path = os.path.join(archive_dir, INDEX_FILENAME)
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 書き込み途中で中断された行は読み飛ばす
+                continue
+            latest[entry['url']] = entry
+    return list(latest.values())
+
+
+def compress(data, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(data, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd で圧縮されたアーカイブを読むには zstandard をインストールしてください。")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def read_entry(archive_dir, entry):
+    """索引エントリに対応する本文を展開して文字列で返す"""
+    with open(os.path.join(archive_dir, entry['file']), 'rb') as f:
+        content = decompress(f.read(), entry['codec'])
+    return content.decode(entry.get('encoding') or 'utf-8', errors='replace')
@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import heapq
+import random
+import signal
+import argparse
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from jm_fetch import Fetcher, RateLimiter, ResponseCache
+from jm_dedup import TitleDeduplicator
+from jm_scraping import crawl, log, RecordWriter
+
+
+class CrawlJob:
+    """設定ファイルの1件分の定期クロール"""
+
+    def __init__(self, config, defaults):
+        def option(key, default=None):
+            return config.get(key, defaults.get(key, default))
+
+        self.name = config['name']
+        self.urls = config.get('urls') or [config['url']]
+        self.interval = float(option('interval', 3600))
+        self.jitter = float(option('jitter', 0.1))
+        self.max_pages = int(option('max_pages', 50))
+        self.pipeline = bool(option('pipeline', False))
+        self.output = option('output', f"{self.name}.jsonl")
+        self.format = option('format', 'jsonl')
+
+        # 重複判定の索引は実行をまたいで保持し、毎回新しい求人だけを出力する
+        self.dedup = None
+        if option('dedup', False):
+            self.dedup = TitleDeduplicator(near_duplicates=bool(option('near_dup', False)))
+
+        self.running = False
+        self.runs = 0
+        self.last_status = None
+
+    def next_delay(self):
+        """次回までの間隔。毎回 ±jitter の割合でずらし、実行時刻が揃わないようにする"""
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class CrawlDaemon:
+    """設定されたクロールをそれぞれの間隔で繰り返し実行する常駐プロセス
+
+    取得処理（セッション・キャッシュ・レート制限）と各ジョブの重複判定の
+    索引はプロセスの起動中ずっと共有・保持される。
+    """
+
+    def __init__(self, jobs, fetcher, max_concurrent=1, min_gap=60.0, status_file=None):
+        self.jobs = jobs
+        self.fetcher = fetcher
+        self.max_concurrent = max_concurrent
+        self.min_gap = min_gap
+        self.status_file = status_file
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def initial_schedule(self):
+        """初回の実行時刻をジョブごとに均等にずらす"""
+        now = time.monotonic()
+        schedule = []
+        for index, job in enumerate(self.jobs):
+            offset = min(job.interval, self.min_gap * len(self.jobs)) * index / len(self.jobs)
+            schedule.append((now + offset, index))
+        heapq.heapify(schedule)
+        return schedule
+
+    def run_job(self, job):
+        started_at = datetime.now()
+        start = time.monotonic()
+        status = 'ok'
+        total = 0
+        duplicates = 0
+        # 出力ファイルを開けない場合なども含め、どこで失敗しても running を戻して状態を記録する
+        try:
+            duplicates_before = job.dedup.duplicate_count if job.dedup else 0
+            log(f"[{started_at:%Y-%m-%d %H:%M:%S}] ジョブ {job.name} を開始します（{job.runs + 1} 回目）")
+            writer = RecordWriter(job.output, job.format, append=True, include_url=len(job.urls) > 1)
+            try:
+                results = crawl(job.urls, job.max_pages, self.fetcher, on_record=writer.write,
+                                pipelined=job.pipeline, dedup=job.dedup)
+                total = sum(len(records) for records in results.values())
+            finally:
+                writer.close()
+            duplicates = (job.dedup.duplicate_count if job.dedup else 0) - duplicates_before
+        except Exception as e:
+            status = f"error: {e}"
+            log(f"ジョブ {job.name} でエラーが発生しました: {str(e)}")
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                job.running = False
+                job.runs += 1
+                job.last_status = {
+                    'status': status,
+                    'started_at': started_at.isoformat(timespec='seconds'),
+                    'elapsed': round(elapsed, 2),
+                    'records': total,
+                    'duplicates': duplicates,
+                    'runs': job.runs,
+                }
+        log(f"ジョブ {job.name} が完了しました: {total} 件（重複 {duplicates} 件）、{elapsed:.1f} 秒")
+        self.write_status()
+
+    def _job_done(self, job, future):
+        # run_job の外に出た例外（状態ファイルの書き込み失敗など）はここでしか分からない
+        if not future.cancelled() and future.exception() is not None:
+            log(f"ジョブ {job.name} の実行中に予期しないエラーが発生しました: {future.exception()!r}")
+
+    def write_status(self):
+        if not self.status_file:
+            return
+        with self._lock:
+            status = {job.name: job.last_status for job in self.jobs}
+        tmp_path = f"{self.status_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.status_file)
+
+    def run(self):
+        schedule = self.initial_schedule()
+        last_start = None
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrent)
+        log(f"{len(self.jobs)} 件のジョブで常駐モードを開始します。")
+        try:
+            while not self.stop_event.is_set():
+                next_time, index = schedule[0]
+                # 直前の開始から min_gap 秒は次のジョブを開始しない
+                if last_start is not None:
+                    next_time = max(next_time, last_start + self.min_gap)
+                wait = next_time - time.monotonic()
+                if wait > 0:
+                    self.stop_event.wait(wait)
+                    continue
+
+                heapq.heappop(schedule)
+                job = self.jobs[index]
+                delay = job.next_delay()
+                with self._lock:
+                    skip = job.running
+                    job.running = True
+                if skip:
+                    log(f"ジョブ {job.name} は前回の実行が終わっていないためスキップします。")
+                else:
+                    future = executor.submit(self.run_job, job)
+                    future.add_done_callback(lambda future, job=job: self._job_done(job, future))
+                    last_start = time.monotonic()
+
+                next_run = datetime.now() + timedelta(seconds=delay)
+                log(f"ジョブ {job.name} の次回実行予定: {next_run:%Y-%m-%d %H:%M:%S}")
+                heapq.heappush(schedule, (time.monotonic() + delay, index))
+        finally:
+            log("常駐モードを終了します。実行中のジョブを停止しています...")
+            self.fetcher.cancel()
+            executor.shutdown(wait=True)
+            self.fetcher.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def load_config(path):
+    """設定ファイル（JSON）を読み込む
+
+    例:
+        {
+            "rate": 0.5,
+            "cache_dir": "cache",
+            "dedup": true,
+            "jobs": [
+                {"name": "tokyo-nurse", "url": "https://job-medley.com/ans/search/?...", "interval": 3600}
+            ]
+        }
+    """
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    if not config.get('jobs'):
+        raise ValueError("設定ファイルにジョブ（jobs）がありません。")
+    return config
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="設定されたクロールを定期的に実行する常駐モード")
+    parser.add_argument('config', help="ジョブを定義したJSONファイル")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    jobs = [CrawlJob(job_config, config) for job_config in config['jobs']]
+
+    # キャッシュの有効期間は、次回の実行で新しいページを取得できるよう最短の間隔の半分を既定にする
+    cache = None
+    if config.get('cache_dir'):
+        cache_ttl = config.get('cache_ttl', min(job.interval for job in jobs) / 2)
+        cache = ResponseCache(config['cache_dir'], cache_ttl)
+    fetcher = Fetcher(
+        min_delay=config.get('min_delay', 1.5),
+        max_delay=config.get('max_delay', 3.0),
+        rate_limiter=RateLimiter(config['rate']) if config.get('rate') else None,
+        cache=cache,
+    )
+    daemon = CrawlDaemon(
+        jobs, fetcher,
+        max_concurrent=config.get('max_concurrent', 1),
+        min_gap=config.get('min_gap', 60.0),
+        status_file=config.get('status_file'),
+    )
+
+    # SIGINT / SIGTERM で実行中のリクエストを中断して終了する
+    def handle_signal(signum, frame):
+        daemon.stop()
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    daemon.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+import re
+import threading
+import unicodedata
+import hashlib
+import random
+from array import array
+
+# 括弧の種類の違いを同一視するための変換表
+BRACKET_TABLE = str.maketrans({
+    '【': '(', '】': ')',
+    '［': '(', '］': ')',
+    '[': '(', ']': ')',
+    '「': '(', '」': ')',
+    '『': '(', '』': ')',
+    '〔': '(', '〕': ')',
+    '〈': '(', '〉': ')',
+    '《': '(', '》': ')',
+    '｛': '(', '｝': ')',
+    '{': '(', '}': ')',
+})
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+# MinHash のハッシュ関数 (a * h + b) mod p に使うメルセンヌ素数
+MERSENNE_PRIME = (1 << 61) - 1
+# 帯の数と行数を決めるときの誤検出の重み（残りが見逃しの重み）
+FALSE_POSITIVE_WEIGHT = 0.1
+# LSH の1つのバケットに登録するタイトル数の上限
+MAX_BUCKET_SIZE = 64
+
+
+def normalize_title(title):
+    """全角・半角、空白、括弧の違いを吸収した比較用の文字列を返す"""
+    title = unicodedata.normalize('NFKC', title)
+    title = title.translate(BRACKET_TABLE)
+    title = WHITESPACE_RE.sub('', title)
+    return title.casefold()
+
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _false_probability(threshold, bands, rows, steps=100):
+    """閾値未満で候補になる確率と、閾値以上で候補にならない確率を積分した値"""
+    def candidate(similarity):
+        return 1 - (1 - similarity ** rows) ** bands
+
+    false_positive = sum(candidate(threshold * (i + 0.5) / steps) for i in range(steps)) * threshold / steps
+    width = 1 - threshold
+    false_negative = sum(1 - candidate(threshold + width * (i + 0.5) / steps) for i in range(steps)) * width / steps
+    return false_positive, false_negative
+
+
+def _optimal_bands(threshold, num_perm):
+    """num_perm 個の署名を分ける帯の数と1帯あたりの行数を返す
+
+    候補は正確な Jaccard 係数で確かめるため、見逃しを誤検出より重く見て選ぶ。
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        false_positive, false_negative = _false_probability(threshold, bands, rows)
+        error = FALSE_POSITIVE_WEIGHT * false_positive + (1 - FALSE_POSITIVE_WEIGHT) * false_negative
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class MinHashIndex:
+    """MinHash と LSH による類似タイトルの索引
+
+    タイトルを文字 n-gram の集合とみなし、n-gram ごとの64ビットハッシュ h から
+    (a * h + b) mod p の形の num_perm 個のハッシュ関数で値を作り、関数ごとの最小値を
+    署名とする。署名を bands 個の帯（1帯あたり rows 個）に分け、いずれかの帯が一致した
+    ものだけを候補として比較する。bands と rows は threshold 付近の類似度で候補に
+    なる確率が高くなるよう、num_perm と threshold から決める。
+
+    署名から推定した Jaccard 係数は誤差が大きく、定型の語句を共有する別のタイトル
+    （「医療法人社団〇〇会 〇〇クリニック」など）を類似と誤判定するため、候補とは
+    登録済みの n-gram のハッシュで正確な Jaccard 係数を計算して判定する。
+    定型の語句で同じ帯に大量のタイトルが集まると比較回数が件数に比例して増えるため、
+    1つのバケットに登録するのは max_bucket_size 件までとする。
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, ngram=3, max_bucket_size=MAX_BUCKET_SIZE, seed=1):
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold は0より大きく1以下の値を指定してください。")
+        if num_perm < 1:
+            raise ValueError("num_perm は1以上の値を指定してください。")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = _optimal_bands(threshold, num_perm)
+        self.ngram = ngram
+        self.max_bucket_size = max_bucket_size
+
+        rng = random.Random(seed)
+        self._permutations = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+                              for _ in range(self.bands * self.rows)]
+
+        # タイトルごとの n-gram のハッシュは64ビット整数として1本の配列に詰め、
+        # 索引番号ごとの開始位置を別の配列で持つ
+        self._shingle_hashes = array('Q')
+        self._offsets = array('Q', [0])
+        self._buckets = {}
+
+    def _shingles(self, text):
+        if len(text) <= self.ngram:
+            return {text}
+        return {text[i:i + self.ngram] for i in range(len(text) - self.ngram + 1)}
+
+    def _shingle_hash_set(self, text):
+        return {_hash64(shingle) for shingle in self._shingles(text)}
+
+    def _signature(self, shingle_hashes):
+        prime = MERSENNE_PRIME
+        return [min((a * h + b) % prime for h in shingle_hashes) for a, b in self._permutations]
+
+    def signature(self, text):
+        return self._signature(self._shingle_hash_set(text))
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            start = band * self.rows
+            yield hash((band, *signature[start:start + self.rows]))
+
+    def _similarity(self, shingle_hashes, index):
+        """登録済みのタイトルとの正確な Jaccard 係数"""
+        start, stop = self._offsets[index], self._offsets[index + 1]
+        common = len(shingle_hashes.intersection(self._shingle_hashes[start:stop]))
+        return common / (len(shingle_hashes) + (stop - start) - common)
+
+    def add_if_new(self, text):
+        """類似するタイトルがなければ登録して True、あれば False を返す"""
+        shingle_hashes = self._shingle_hash_set(text)
+        keys = list(self._band_keys(self._signature(shingle_hashes)))
+
+        # 複数の帯で同じタイトルが候補になっても比較は1回だけにする
+        checked = set()
+        for key in keys:
+            candidates = self._buckets.get(key)
+            if candidates is None:
+                continue
+            # バケットには1件ならint、複数ならarrayで索引番号を持つ
+            for index in (candidates,) if isinstance(candidates, int) else candidates:
+                if index in checked:
+                    continue
+                checked.add(index)
+                if self._similarity(shingle_hashes, index) >= self.threshold:
+                    return False
+
+        index = len(self._offsets) - 1
+        self._shingle_hashes.extend(shingle_hashes)
+        self._offsets.append(len(self._shingle_hashes))
+        for key in keys:
+            candidates = self._buckets.get(key)
+            if candidates is None:
+                self._buckets[key] = index
+            elif isinstance(candidates, int):
+                self._buckets[key] = array('I', (candidates, index))
+            elif len(candidates) < self.max_bucket_size:
+                candidates.append(index)
+        return True
+
+
+class TitleDeduplicator:
+    """求人タイトルの重複を、見つけた順に1件ずつ判定する
+
+    正規化したタイトルの64ビットハッシュを集合で保持して完全一致を判定し、
+    near_duplicates=True の場合は MinHashIndex で類似タイトルも重複とみなす。
+    複数スレッドから同時に呼び出せる。
+    """
+
+    def __init__(self, near_duplicates=False, threshold=0.8):
+        self._seen = set()
+        self._near_index = MinHashIndex(threshold) if near_duplicates else None
+        self._lock = threading.Lock()
+        self.duplicate_count = 0
+
+    def is_duplicate(self, title):
+        """既出のタイトルなら True を返す。新しいタイトルは記録して False を返す"""
+        normalized = normalize_title(title)
+        key = _hash64(normalized)
+        with self._lock:
+            if key in self._seen:
+                self.duplicate_count += 1
+                return True
+            if self._near_index is not None and not self._near_index.add_if_new(normalized):
+                self.duplicate_count += 1
+                return True
+            self._seen.add(key)
+            return False
+
+    def __len__(self):
+        return len(self._seen)
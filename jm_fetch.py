@@ -0,0 +1,443 @@
+import threading
+import random
+import socket
+import time
+import os
+import json
+import hashlib
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError, SSLError
+
+# brotli がインストールされていれば urllib3 が br を展開できるので、br も要求する
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'gzip, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip'
+
+# 接続タイムアウトと読み込みタイムアウト（秒）
+# 読み込みタイムアウトはソケットの1回の受信ごとに適用されるため、少しずつ
+# データを送り続けるサーバーに対してはリクエスト全体の時間を制限できない
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 10.0
+
+# 1回のリクエスト（接続から本文の読み込み完了まで）にかける時間の上限（秒）
+# 超えた時点で接続を切断し、requests.Timeout を送出する
+TOTAL_TIMEOUT = 60.0
+
+# レスポンス本文を1回に読み込む上限（停止要求と時間の上限はこの単位で確認する）
+# urllib3 2.x では受信した分だけをすぐに返すが、read1 のない 1.x では
+# この大きさが揃うまで確認できないため、小さめにしておく
+CHUNK_SIZE = 1024
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'ja,en-US;q=0.7,en;q=0.3',
+    'Accept-Encoding': ACCEPT_ENCODING,
+    'Referer': 'https://job-medley.com/',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'max-age=0',
+}
+
+
+class FetchCancelled(Exception):
+    """停止要求によってリクエストや待機が中断されたことを示す例外"""
+
+
+def _shutdown(conn):
+    """受信を待っているスレッドがすぐに戻るよう、接続のソケットを切断する
+
+    close() と違い、読み込み中のスレッドが持つバッファのロックを待たない。
+    SSLSocket.shutdown() は暗号化の状態を解放してしまうため、下のソケットの
+    shutdown() を直接呼ぶ。
+    """
+    sock = getattr(conn, 'sock', None)
+    if sock is None:
+        return
+    try:
+        socket.socket.shutdown(sock, socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class _RequestWatch:
+    """1回のリクエストで使う接続を、停止要求か時間の上限で切断する
+
+    ヘッダーの受信中は本文のようにチャンクごとの確認ができないため、
+    接続そのものを切断して受信を打ち切る。
+    """
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.expired = False
+        self._aborted = False
+        self._connections = []
+        self._lock = threading.Lock()
+        self._timer = threading.Timer(max(0.0, deadline - time.monotonic()), self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def add(self, conn):
+        with self._lock:
+            if self._connections is None:
+                return
+            self._connections.append(conn)
+            aborted = self._aborted
+        if aborted:
+            _shutdown(conn)
+
+    def abort(self):
+        with self._lock:
+            self._aborted = True
+            connections = list(self._connections or ())
+        for conn in connections:
+            _shutdown(conn)
+
+    def _expire(self):
+        self.expired = True
+        self.abort()
+
+    def close(self):
+        """リクエストが終わった後は、接続がプールで再利用されても切断しない"""
+        self._timer.cancel()
+        with self._lock:
+            self._connections = None
+
+
+# session.get() を実行しているスレッドのリクエストの _RequestWatch
+_current = threading.local()
+
+
+class _WatchedPoolMixin:
+    def _validate_conn(self, conn):
+        super()._validate_conn(conn)
+        watch = getattr(_current, 'watch', None)
+        if watch is None:
+            return
+        # HTTP は送信時に接続するため、切断できるよう先に接続しておく
+        # （HTTPS はここで接続済み）
+        if getattr(conn, 'sock', None) is None:
+            conn.connect()
+        watch.add(conn)
+
+
+class _WatchedHTTPConnectionPool(_WatchedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _WatchedHTTPSConnectionPool(_WatchedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+WATCHED_POOL_CLASSES = {'http': _WatchedHTTPConnectionPool, 'https': _WatchedHTTPSConnectionPool}
+
+
+class _WatchedAdapter(HTTPAdapter):
+    """接続を _RequestWatch に登録するコネクションプールを使うアダプター"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = WATCHED_POOL_CLASSES
+
+    def proxy_manager_for(self, *args, **kwargs):
+        manager = super().proxy_manager_for(*args, **kwargs)
+        manager.pool_classes_by_scheme = WATCHED_POOL_CLASSES
+        return manager
+
+
+class RateLimiter:
+    """複数スレッドで共有するリクエスト数の上限（1秒あたり rate 件）"""
+
+    def __init__(self, rate):
+        if rate <= 0:
+            raise ValueError("レート制限は0より大きい値を指定してください。")
+        self.interval = 1.0 / rate
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """次のリクエスト枠を予約し、それまでの待ち時間（秒）を返す"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + self.interval
+            return start - now
+
+
+class ResponseCache:
+    """取得済みページをURLごとにディスクへ保存するキャッシュ"""
+
+    def __init__(self, cache_dir, max_age=None):
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, url):
+        path = self._path(url)
+        try:
+            if self.max_age is not None and time.time() - os.path.getmtime(path) > self.max_age:
+                return None
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        response = requests.Response()
+        response.status_code = data['status_code']
+        response.url = data['url']
+        response.encoding = 'utf-8'
+        response._content = data['text'].encode('utf-8')
+        return response
+
+    def put(self, url, response):
+        path = self._path(url)
+        data = {'url': url, 'status_code': response.status_code, 'text': response.text}
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+class Fetcher:
+    """タイムアウトと停止要求に対応したHTTP取得処理
+
+    スレッドセーフで、複数スレッドから同時に get() を呼び出せる。
+    cancel() を呼ぶと待機中の sleep() と、ヘッダーや本文を受信中の get()・stream() は
+    すぐに FetchCancelled で中断される（接続中の場合は接続できた時点か接続タイムアウト）。
+    """
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 min_delay=1.5, max_delay=3.0, headers=None, rate_limiter=None, cache=None,
+                 archive=None, total_timeout=TOTAL_TIMEOUT):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.archive = archive
+        self.headers = dict(DEFAULT_HEADERS)
+        if headers:
+            self.headers.update(headers)
+
+        self.session = requests.Session()
+        adapter = _WatchedAdapter()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.cancel_event = threading.Event()
+        self._linked_events = set()
+        self._watches = set()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        """停止要求を出してすぐに戻る
+
+        読み込み中のレスポンスを別スレッドから close() すると、読み込みが終わるまで
+        呼び出し元（GUIのスレッドなど）が止まってしまうため、ソケットの shutdown() で
+        受信だけを打ち切る。レスポンスはリクエストを実行しているスレッドが閉じる。
+        """
+        self.cancel_event.set()
+        with self._lock:
+            linked_events = list(self._linked_events)
+            watches = list(self._watches)
+        for event in linked_events:
+            event.set()
+        for watch in watches:
+            watch.abort()
+
+    def reset(self):
+        """停止要求を解除して再利用できる状態に戻す"""
+        self.cancel_event.clear()
+
+    def close(self):
+        self.session.close()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise FetchCancelled("停止要求により中断しました")
+
+    def sleep(self, seconds, stop_event=None):
+        """停止要求があればすぐに戻る sleep
+
+        stop_event を渡した場合は、そのイベントがセットされたときにも待機を
+        切り上げて戻る（例外にはしない）。
+        """
+        if stop_event is None:
+            if self.cancel_event.wait(seconds):
+                raise FetchCancelled("停止要求により待機を中断しました")
+            return
+
+        # cancel() でも stop_event がセットされるように登録してから待つ
+        with self._lock:
+            self._linked_events.add(stop_event)
+        try:
+            if self.cancel_event.is_set():
+                stop_event.set()
+            stop_event.wait(seconds)
+        finally:
+            with self._lock:
+                self._linked_events.discard(stop_event)
+        self.check_cancelled()
+
+    def random_delay(self):
+        """アクセス制限回避のためのランダムな遅延"""
+        self.sleep(random.uniform(self.min_delay, self.max_delay))
+
+    def fetch(self, url, headers=None, not_before=None, stop_event=None, kind='page'):
+        """キャッシュにあればそれを返し、なければ遅延を入れてから取得する
+
+        not_before（time.monotonic() の値）を渡すと、ランダムな遅延の代わりに
+        その時刻まで待ってからリクエストを送る。待機中に stop_event が
+        セットされた場合はリクエストを送らずに None を返す。
+        kind はアーカイブの索引に記録するページの種類。キャッシュから返した
+        ページもアーカイブに保存する。
+        """
+        response = self.cache.get(url) if self.cache is not None else None
+        if response is None:
+            if not_before is None:
+                self.random_delay()
+            else:
+                self.sleep(max(0.0, not_before - time.monotonic()), stop_event)
+            if stop_event is not None and stop_event.is_set():
+                return None
+            response = self.get(url, headers)
+            if self.cache is not None and response.status_code == 200:
+                self.cache.put(url, response)
+
+        if self.archive is not None:
+            self.archive.put(url, response, kind)
+        return response
+
+    def get(self, url, headers=None):
+        """URLを取得して requests.Response を返す
+
+        本文はチャンク単位で読み込み、チャンクごとに停止要求と時間の上限を確認する。
+        """
+        response, watch = self._open(url, headers)
+        body = bytearray()
+        for chunk in self._iter_body(response, watch):
+            body.extend(chunk)
+
+        # 読み込んだ本文を設定し、通常の response.text で参照できるようにする
+        response._content = bytes(body)
+        response._content_consumed = True
+        return response
+
+    def stream(self, url, headers=None):
+        """遅延を入れてからURLを取得し、本文をチャンク単位で順に返す
+
+        本文全体をメモリに読み込まないため、大きなファイルの逐次処理に使う。
+        ステータスコードが200以外の場合は requests.HTTPError を送出する。
+        """
+        self.random_delay()
+        response, watch = self._open(url, headers)
+        if response.status_code != 200:
+            self._finish(response, watch)
+            raise requests.HTTPError(f"ステータスコード {response.status_code}: {url}", response=response)
+        yield from self._iter_body(response, watch)
+
+    def _open(self, url, headers=None):
+        """リクエストを送ってヘッダーを受信し、(レスポンス, _RequestWatch) を返す"""
+        self.check_cancelled()
+        if self.rate_limiter is not None:
+            self.sleep(self.rate_limiter.reserve())
+
+        request_headers = dict(self.headers)
+        if headers:
+            request_headers.update(headers)
+
+        watch = _RequestWatch(time.monotonic() + self.total_timeout)
+        with self._lock:
+            self._watches.add(watch)
+        # 登録より前に出た停止要求は cancel() から見えないため、ここで反映する
+        if self.cancel_event.is_set():
+            watch.abort()
+
+        _current.watch = watch
+        try:
+            response = self.session.get(
+                url,
+                headers=request_headers,
+                timeout=(self.connect_timeout, self.read_timeout),
+                stream=True,
+            )
+        except Exception:
+            self._finish(None, watch)
+            self._check_aborted(watch, url)
+            raise
+        finally:
+            _current.watch = None
+        return response, watch
+
+    def _finish(self, response, watch):
+        if response is not None:
+            response.close()
+        watch.close()
+        with self._lock:
+            self._watches.discard(watch)
+
+    def _check_aborted(self, watch, url):
+        """停止要求か時間の上限で接続を切断していれば、それに応じた例外を送出する"""
+        self.check_cancelled()
+        if watch.expired or time.monotonic() > watch.deadline:
+            raise requests.Timeout(f"{self.total_timeout:g} 秒以内に読み込みが終わりませんでした: {url}")
+
+    def _read_chunks(self, response):
+        """本文を受信した分ずつ返す
+
+        iter_content() は指定した大きさが揃うまで戻らないため、少しずつ
+        送ってくるサーバーでは停止要求や時間の上限を確認できなくなる。
+        read1() は1回の受信で戻るので、確認の間隔は最大でも読み込みタイムアウトになる。
+        """
+        raw = response.raw
+        if not hasattr(raw, 'read1'):
+            # urllib3 1.x
+            yield from response.iter_content(CHUNK_SIZE)
+            return
+        # 例外は iter_content() と同じく requests の例外に変換する
+        try:
+            while True:
+                chunk = raw.read1(CHUNK_SIZE, decode_content=True)
+                if not chunk:
+                    return
+                yield chunk
+        except ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e)
+        except DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e)
+        except ReadTimeoutError as e:
+            raise requests.ConnectionError(e)
+        except SSLError as e:
+            raise requests.exceptions.SSLError(e)
+
+    def _iter_body(self, response, watch):
+        # レスポンスは必ずこのスレッドで閉じる（cancel() はソケットの切断だけ行う）
+        try:
+            for chunk in self._read_chunks(response):
+                self._check_aborted(watch, response.url)
+                yield chunk
+            # 長さの分からない本文は切断されても途中で終わったように見える
+            self._check_aborted(watch, response.url)
+        except (FetchCancelled, requests.Timeout):
+            raise
+        except Exception:
+            # 停止要求か時間の上限で切断した場合は、それに応じた例外にする
+            self._check_aborted(watch, response.url)
+            raise
+        finally:
+            self._finish(response, watch)
@@ -0,0 +1,153 @@
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# ページ番号を表すクエリパラメータ
+PAGE_PARAM = 'page'
+# ページ番号として扱う値（str.isdigit() は '²' のような数字も含むため使わない）
+PAGE_VALUE_RE = re.compile(r'[0-9]+')
+
+# メモリ上に記録するページ数の上限。超えた分は最も古く参照されたものから忘れる
+# （1件あたり100バイト程度のため、上限まで記録しても10MB程度に収まる）
+MAX_MEMORY_ENTRIES = 100000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (
+    digest INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    seen_at REAL NOT NULL
+);
+"""
+
+
+def _split(url):
+    """URLを (正規化したURLの各部分, ページ以外のパラメータ, ページ番号) に分ける"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    try:
+        # 既定のポート番号は省略する
+        if (scheme, parts.port) in (('http', 80), ('https', 443)):
+            netloc = netloc.rsplit(':', 1)[0]
+    except ValueError:
+        pass
+
+    params = []
+    page = 1
+    # パラメータはデコードしてから扱うため、%5B%5D と [] のような表記の違いは同じになる
+    for key, value in parse_qsl(parts.query, keep_blank_values=True):
+        if key == PAGE_PARAM:
+            page = int(value) if PAGE_VALUE_RE.fullmatch(value) and int(value) > 0 else 1
+        else:
+            params.append((key, value))
+    return (scheme, netloc, parts.path or '/'), params, page
+
+
+def _join(parts, params):
+    return urlunsplit((*parts, urlencode(sorted(params)), ''))
+
+
+def canonicalize(url):
+    """URLを (ページ番号を除いた正規化済みのURL, ページ番号) に分ける
+
+    パラメータはデコードしてキーと値の順に並べ、フラグメントは取り除く。
+    表記が違っても同じ検索結果を指すURLは同じ文字列になる。
+    """
+    parts, params, page = _split(url)
+    return _join(parts, params), page
+
+
+def page_url(url, page):
+    """URLの page パラメータを指定したページ番号にした正規化済みのURLを返す（1ページ目は page を付けない）"""
+    parts, params, _ = _split(url)
+    if page > 1:
+        params.append((PAGE_PARAM, str(page)))
+    return _join(parts, params)
+
+
+def page_number(url):
+    """URLの page パラメータの値を返す（なければ1）"""
+    return _split(url)[2]
+
+
+def _digest(url):
+    # SQLite の INTEGER に収まるよう符号付きの64ビット整数にする
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+class Frontier:
+    """取得するページのURLを正規化し、取得済みのページを記録する
+
+    同じページは表記が違っても1回のクロールで一度しか取得しない。
+    path を指定するとSQLiteファイルに記録して実行をまたいで保持し（max_age 秒を
+    過ぎたページは再び取得する）、省略するとメモリ上に記録する。どちらの場合も
+    URLそのものではなく64ビットのダイジェストで判定する。メモリ上の記録は
+    max_entries 件を超えると最も古く参照されたページから忘れるため、使用メモリは
+    一定の範囲に収まる（忘れたページは再び取得されうる）。ファイルに記録する場合は
+    メモリをほとんど使わない。複数スレッドから同時に呼び出せる。
+    """
+
+    def __init__(self, path=None, max_age=None, max_entries=MAX_MEMORY_ENTRIES):
+        self.path = path
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if path:
+            self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        # sqlite3 の接続はスレッドをまたいで使えないため、スレッドごとに作る
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def add(self, url):
+        """未取得のページなら取得済みとして記録して True、取得済みなら False を返す"""
+        url = page_url(url, page_number(url))
+        digest = _digest(url)
+        if not self.path:
+            with self._lock:
+                if digest in self._seen:
+                    self._seen.move_to_end(digest)
+                    return False
+                self._seen[digest] = None
+                if len(self._seen) > self.max_entries:
+                    self._seen.popitem(last=False)
+                return True
+
+        now = time.time()
+        expires = now - self.max_age if self.max_age is not None else float('-inf')
+        cursor = self._connect().execute(
+            "INSERT INTO seen (digest, url, seen_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (digest) DO UPDATE SET seen_at = excluded.seen_at WHERE seen.seen_at < ?",
+            (digest, url, now, expires),
+        )
+        return cursor.rowcount > 0
+
+    def discard(self, url):
+        """取得に失敗したページの記録を取り消し、次の機会に取得し直せるようにする"""
+        digest = _digest(page_url(url, page_number(url)))
+        if not self.path:
+            with self._lock:
+                self._seen.pop(digest, None)
+            return
+        self._connect().execute("DELETE FROM seen WHERE digest = ?", (digest,))
+
+    def __len__(self):
+        if not self.path:
+            return len(self._seen)
+        return self._connect().execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,26 @@
+import threading
+import importlib
+
+# スクレイピング処理で使うモジュール。GUI版は起動時には読み込まず、
+# ウィンドウを表示した後にバックグラウンドで読み込む
+ENGINE_MODULES = ('bs4', 'jm_fetch', 'jm_dedup', 'jm_records', 'jm_frontier', 'jm_profile')
+
+
+def _import_all(modules):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            # 読み込めないモジュールは実際に使う時点でエラーとして報告する
+            pass
+
+
+def preload_engine(modules=ENGINE_MODULES):
+    """modules を別スレッドで読み込み、そのスレッドを返す
+
+    読み込み中に同じモジュールを import した場合は、読み込みが終わるまで
+    待ってから同じモジュールが返される。
+    """
+    thread = threading.Thread(target=_import_all, args=(modules,), name='jm-preload', daemon=True)
+    thread.start()
+    return thread
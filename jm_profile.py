@@ -0,0 +1,191 @@
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+
+# 環境変数で出力先を指定すると、GUI版でもプロファイルを取得する
+PROFILE_ENV = 'JM_PROFILE'
+
+# サンプリング間隔（秒）
+SAMPLE_INTERVAL = 0.005
+
+# レポートに載せる件数
+TOP_COUNT = 30
+
+
+def _frame_label(frame):
+    """スタックの1フレームを「関数名 (モジュール:行)」の形式で表す"""
+    module = frame.f_globals.get('__name__', '?')
+    return f"{frame.f_code.co_name} ({module}:{frame.f_lineno})".replace(';', ',')
+
+
+def _function_label(label):
+    """行番号を除いた関数単位のラベル"""
+    return label.rsplit(':', 1)[0] + ')'
+
+
+class RunProfiler:
+    """1回の実行のCPU時間とメモリ割り当てを記録し、終了時にファイルへ書き出す
+
+    CPUは別スレッドから一定間隔でスタックを採取するサンプリング方式のため、
+    複数スレッドのクロールや通信の待ち時間もそのまま記録される。
+    メモリは tracemalloc で開始時と終了時のスナップショットを取る。
+
+    出力するファイル:
+        <prefix>.folded     スタックごとのサンプル数（flamegraph.pl や speedscope でそのまま読める形式）
+        <prefix>.cpu.txt    関数・行ごとのサンプル数の集計
+        <prefix>.alloc.txt  割り当ての多い行と、開始時からの増加の上位
+    """
+
+    def __init__(self, prefix, interval=SAMPLE_INTERVAL, all_threads=False, trace_memory=True):
+        self.prefix = prefix
+        self.interval = interval
+        self.all_threads = all_threads
+        self.trace_memory = trace_memory
+        self.stacks = Counter()
+        self.samples = 0
+        self.paths = []
+        self._target_ident = None
+        self._thread_names = {}
+        self._stop_event = threading.Event()
+        self._sampler = None
+        self._started_tracemalloc = False
+        self._start_snapshot = None
+        self._start_time = None
+        self._elapsed = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def start(self):
+        self._target_ident = threading.get_ident()
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            tracemalloc.reset_peak()
+            self._start_snapshot = tracemalloc.take_snapshot()
+        self._stop_event.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name='jm-profiler', daemon=True)
+        self._start_time = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self):
+        """採取を止めてファイルを書き出し、書き出したパスのリストを返す"""
+        self._stop_event.set()
+        self._sampler.join()
+        self._elapsed = time.perf_counter() - self._start_time
+
+        directory = os.path.dirname(self.prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.paths = [self.write_folded(f"{self.prefix}.folded"),
+                      self.write_cpu_report(f"{self.prefix}.cpu.txt")]
+        if self.trace_memory:
+            end_snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            self.paths.append(self.write_alloc_report(f"{self.prefix}.alloc.txt", end_snapshot, current, peak))
+        return self.paths
+
+    def _thread_name(self, ident):
+        name = self._thread_names.get(ident)
+        if name is None:
+            self._thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            name = self._thread_names.get(ident, str(ident))
+        return name
+
+    def _sample_loop(self):
+        own_ident = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident or (not self.all_threads and ident != self._target_ident):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(self._thread_name(ident))
+                stack.reverse()
+                self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    def write_folded(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+        return path
+
+    def write_cpu_report(self, path):
+        self_counts = Counter()
+        total_counts = Counter()
+        line_counts = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack[1:]
+            if not frames:
+                continue
+            line_counts[frames[-1]] += count
+            self_counts[_function_label(frames[-1])] += count
+            # 再帰していても1つのスタックでは1回だけ数える
+            for function in {_function_label(frame) for frame in frames}:
+                total_counts[function] += count
+
+        total = sum(self.stacks.values()) or 1
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"実行時間: {self._elapsed:.2f} 秒、採取回数: {self.samples} 回（間隔 {self.interval * 1000:.0f} ミリ秒）、"
+                    f"スタック数: {total}\n")
+            if self.trace_memory:
+                f.write("tracemalloc が有効なため、割り当ての多い処理は実際より長く計測されます。\n")
+            for title, counter in (("関数ごと（その関数自身）", self_counts),
+                                   ("関数ごと（呼び出し先を含む）", total_counts),
+                                   ("行ごと", line_counts)):
+                f.write(f"\n{title}:\n")
+                for label, count in counter.most_common(TOP_COUNT):
+                    f.write(f"{count:8d} {count / total:7.1%}  {label}\n")
+        return path
+
+    def write_alloc_report(self, path, snapshot, current, peak):
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ]
+        snapshot = snapshot.filter_traces(filters)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"終了時の使用量: {current / 1024:.1f} KiB、ピーク: {peak / 1024:.1f} KiB\n")
+            f.write("\n終了時に確保されている割り当て（行ごと）:\n")
+            for stat in snapshot.statistics('lineno')[:TOP_COUNT]:
+                f.write(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} 個  {stat.traceback[0]}\n")
+            if self._start_snapshot is not None:
+                f.write("\n開始時からの増加（行ごと）:\n")
+                start_snapshot = self._start_snapshot.filter_traces(filters)
+                for stat in snapshot.compare_to(start_snapshot, 'lineno')[:TOP_COUNT]:
+                    f.write(f"{stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} 個  {stat.traceback[0]}\n")
+        return path
+
+
+def profile_prefix(base):
+    """実行ごとに別のファイルになるよう、日時を付けた出力先を返す"""
+    return f"{base}-profile-{datetime.now():%Y%m%d-%H%M%S}"
+
+
+def env_profiler(name, **kwargs):
+    """環境変数 JM_PROFILE が設定されていれば RunProfiler を、なければ何もしないコンテキストを返す
+
+    JM_PROFILE にはディレクトリを指定する（空の場合はカレントディレクトリ）。
+    """
+    directory = os.environ.get(PROFILE_ENV)
+    if directory is None:
+        return nullcontext()
+    return RunProfiler(profile_prefix(os.path.join(directory, name)), **kwargs)
@@ -0,0 +1,259 @@
+import sqlite3
+import threading
+import time
+import uuid
+
+# リースの既定の長さ（秒）。ワーカーはこの間隔より短い周期でハートビートを送る
+LEASE_SECONDS = 60.0
+
+# 同じタスクを再試行する上限回数
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL DEFAULT 'page',
+    url TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    max_pages INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_id TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    done_at REAL,
+    UNIQUE (kind, url, page)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, id);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    title TEXT NOT NULL
+);
+"""
+
+
+class Task:
+    """キューから取り出したタスク"""
+
+    def __init__(self, id, kind, url, page, max_pages, lease_id, attempts):
+        self.id = id
+        self.kind = kind
+        self.url = url
+        self.page = page
+        self.max_pages = max_pages
+        self.lease_id = lease_id
+        self.attempts = attempts
+
+
+class WorkQueue:
+    """SQLiteファイルを共有するリース付きのタスクキュー
+
+    複数のプロセス・ホストから同じファイルを開いて使う。タスクは claim() で
+    リースを取得したワーカーだけが処理でき、期限切れのリースは次の claim()
+    で自動的に pending に戻される（試行回数が上限に達していれば failed）。
+    同じ (kind, url, page) のタスクは一度しか登録されないため、同じページが
+    二重に取得されることはない。
+
+    タスクの種類（kind）は、検索結果のページをたどる 'page' と、求人1件の
+    詳細ページを取得する 'detail' の2つ。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        # done_at がなかった頃に作ったファイルには列を追加する
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+        if 'done_at' not in columns:
+            conn.execute("ALTER TABLE tasks ADD COLUMN done_at REAL")
+
+    def _connect(self):
+        # sqlite3 の接続はスレッドをまたいで使えないため、スレッドごとに作る
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._connect()
+        # 書き込みロックを先に取り、複数ワーカーが同じタスクを取得しないようにする
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def enqueue(self, url, page=1, max_pages=50, kind='page', restart=False, modified_at=None):
+        """タスクを登録する。すでに登録済みなら何もしない
+
+        restart=True の場合、同じ (kind, url) のタスクがすべて完了・失敗して
+        いれば（以前の実行の分であれば）、続きのページも含めてそのタスクと結果を
+        消してから登録し直す。処理待ち・処理中のタスクが残っていれば、実行中の
+        ものとみなしてそのままにする。modified_at（UNIX時刻）を渡すと、
+        その時刻以降に完了したタスクがある場合も登録し直さない。
+        """
+        if not restart:
+            cursor = self._connect().execute(
+                "INSERT OR IGNORE INTO tasks (kind, url, page, max_pages) VALUES (?, ?, ?, ?)",
+                (kind, url, page, max_pages),
+            )
+            return cursor.rowcount > 0
+
+        conn = self._transaction()
+        try:
+            active = conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE kind = ? AND url = ? "
+                "AND (status IN ('pending', 'leased') OR done_at >= ?)",
+                (kind, url, modified_at),
+            ).fetchone()[0]
+            if not active:
+                conn.execute(
+                    "DELETE FROM results WHERE task_id IN (SELECT id FROM tasks WHERE kind = ? AND url = ?)",
+                    (kind, url),
+                )
+                conn.execute("DELETE FROM tasks WHERE kind = ? AND url = ?", (kind, url))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO tasks (kind, url, page, max_pages) VALUES (?, ?, ?, ?)",
+                (kind, url, page, max_pages),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount > 0
+
+    def requeue_expired(self, conn=None, max_attempts=MAX_ATTEMPTS):
+        """リース期限が切れたタスクを pending に戻し、戻した件数を返す
+
+        試行回数が上限に達していたタスクは fail() と同じく failed にする。
+        """
+        conn = conn or self._connect()
+        now = time.time()
+        conn.execute(
+            "UPDATE tasks SET status = 'failed', worker = NULL, lease_id = NULL, lease_until = NULL, "
+            "error = 'リースの期限切れ' WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+            (now, max_attempts),
+        )
+        cursor = conn.execute(
+            "UPDATE tasks SET status = 'pending', worker = NULL, lease_id = NULL, lease_until = NULL "
+            "WHERE status = 'leased' AND lease_until < ?",
+            (now,),
+        )
+        return cursor.rowcount
+
+    def claim(self, worker, lease_seconds=LEASE_SECONDS):
+        """pending のタスクを1件リースして返す。なければ None"""
+        conn = self._transaction()
+        try:
+            self.requeue_expired(conn)
+            row = conn.execute(
+                "SELECT id, kind, url, page, max_pages, attempts FROM tasks "
+                "WHERE status = 'pending' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            lease_id = uuid.uuid4().hex
+            conn.execute(
+                "UPDATE tasks SET status = 'leased', worker = ?, lease_id = ?, lease_until = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (worker, lease_id, time.time() + lease_seconds, row[0]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        task_id, kind, url, page, max_pages, attempts = row
+        return Task(task_id, kind, url, page, max_pages, lease_id, attempts + 1)
+
+    def heartbeat(self, task, lease_seconds=LEASE_SECONDS):
+        """リースを延長する。リースを失っていた場合は False を返す"""
+        cursor = self._connect().execute(
+            "UPDATE tasks SET lease_until = ? WHERE id = ? AND lease_id = ? AND status = 'leased'",
+            (time.time() + lease_seconds, task.id, task.lease_id),
+        )
+        return cursor.rowcount > 0
+
+    def complete(self, task, records, next_tasks=()):
+        """結果を書き込んでタスクを完了にし、続きのタスクを登録する
+
+        リースを失っていた場合（期限切れで他のワーカーに渡った場合）は
+        何も書き込まずに False を返す。
+        """
+        conn = self._transaction()
+        try:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = 'done', lease_until = NULL, done_at = ? "
+                "WHERE id = ? AND lease_id = ? AND status = 'leased'",
+                (time.time(), task.id, task.lease_id),
+            )
+            if cursor.rowcount == 0:
+                conn.execute("ROLLBACK")
+                return False
+
+            conn.executemany(
+                "INSERT INTO results (task_id, url, page, title) VALUES (?, ?, ?, ?)",
+                [(task.id, task.url, record['page'], record['title']) for record in records],
+            )
+            for url, page, max_pages in next_tasks:
+                conn.execute(
+                    "INSERT OR IGNORE INTO tasks (kind, url, page, max_pages) VALUES (?, ?, ?, ?)",
+                    (task.kind, url, page, max_pages),
+                )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release(self, task):
+        """処理せずにリースを返却する（停止要求など）。試行回数には数えない"""
+        self._connect().execute(
+            "UPDATE tasks SET status = 'pending', worker = NULL, lease_id = NULL, lease_until = NULL, "
+            "attempts = attempts - 1 WHERE id = ? AND lease_id = ? AND status = 'leased'",
+            (task.id, task.lease_id),
+        )
+
+    def fail(self, task, error, max_attempts=MAX_ATTEMPTS):
+        """タスクを失敗として返却する。上限回数までは pending に戻して再試行させる"""
+        status = 'failed' if task.attempts >= max_attempts else 'pending'
+        self._connect().execute(
+            "UPDATE tasks SET status = ?, worker = NULL, lease_id = NULL, lease_until = NULL, error = ? "
+            "WHERE id = ? AND lease_id = ?",
+            (status, str(error), task.id, task.lease_id),
+        )
+
+    def counts(self):
+        """状態ごとのタスク数を返す"""
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        return dict(rows)
+
+    def is_drained(self):
+        """処理待ち・処理中のタスクが残っていなければ True"""
+        counts = self.counts()
+        return counts.get('pending', 0) == 0 and counts.get('leased', 0) == 0
+
+    def iter_results(self, urls=None):
+        """書き込まれた結果をURL・ページ順に返す
+
+        urls を指定すると、そのURLのタスクの結果だけを返す（同じファイルを
+        使い回した場合に、以前の実行で登録した別のURLの結果を含めない）。
+        """
+        cursor = self._connect().execute(
+            "SELECT url, page, title FROM results ORDER BY url, page, id"
+        )
+        for url, page, title in cursor:
+            if urls is not None and url not in urls:
+                continue
+            yield url, {'page': page, 'title': title}
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
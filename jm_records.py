@@ -0,0 +1,67 @@
+import sys
+import csv
+from array import array
+
+FIELDNAMES = ['page', 'title']
+
+
+class RecordStore:
+    """抽出した求人を列ごとに保持するコンテナ
+
+    ページ番号は整数の配列に、タイトルはインターンした文字列のリストに
+    格納するため、1件ごとに辞書を作るよりも少ないメモリで保持できる。
+    ページごとの件数は追加のたびに更新されるので、集計で全件を
+    たどり直す必要はない。反復すると従来どおり {'page', 'title'} の
+    辞書を1件ずつ返す。
+    """
+
+    __slots__ = ('_pages', '_titles', 'page_counts')
+
+    def __init__(self, records=()):
+        self._pages = array('i')
+        self._titles = []
+        self.page_counts = {}
+        for record in records:
+            self.append(record)
+
+    def add(self, page, title):
+        self._pages.append(page)
+        # 同じタイトルが何度現れても文字列の実体は1つにする
+        self._titles.append(sys.intern(title))
+        self.page_counts[page] = self.page_counts.get(page, 0) + 1
+
+    def append(self, record):
+        self.add(record['page'], record['title'])
+
+    def __len__(self):
+        return len(self._titles)
+
+    def __iter__(self):
+        for page, title in zip(self._pages, self._titles):
+            yield {'page': page, 'title': title}
+
+    def __getitem__(self, index):
+        # スライスは同じ形式の RecordStore として返す
+        if isinstance(index, slice):
+            store = RecordStore()
+            for page, title in zip(self._pages[index], self._titles[index]):
+                store.add(page, title)
+            return store
+        return {'page': self._pages[index], 'title': self._titles[index]}
+
+    def rows(self):
+        """(ページ, タイトル) のタプルを順に返す"""
+        return zip(self._pages, self._titles)
+
+    def sorted_page_counts(self):
+        return sorted(self.page_counts.items())
+
+    def write_csv(self, csvfile, header=True):
+        writer = csv.writer(csvfile)
+        if header:
+            writer.writerow(FIELDNAMES)
+        writer.writerows(self.rows())
+
+    def save_csv(self, filename):
+        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+            self.write_csv(csvfile)
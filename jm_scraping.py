@@ -1,188 +1,726 @@
-import requests
 from bs4 import BeautifulSoup
-import re
 import csv
-import time
-import random
 import os
+import sys
+import json
+import argparse
+import socket
+import threading
+import queue
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from jm_fetch import Fetcher, FetchCancelled, RateLimiter, ResponseCache
+from jm_queue import WorkQueue, LEASE_SECONDS
+from jm_archive import HtmlArchive, read_index, read_entry, CODEC_EXTENSIONS
+from jm_dedup import TitleDeduplicator
+from jm_records import RecordStore
+from jm_profile import RunProfiler, profile_prefix
+from jm_frontier import Frontier, canonicalize, page_url, page_number
+
+DEFAULT_URL = "https://job-medley.com/ans/search/?job_category_code=ans&prefecture_id=13&city_id%5B%5D=13101&city_id%5B%5D=13102&city_id%5B%5D=13103&city_id%5B%5D=13104&city_id%5B%5D=13105&city_id%5B%5D=13106&city_id%5B%5D=13107&city_id%5B%5D=13108&city_id%5B%5D=13109&city_id%5B%5D=13110&city_id%5B%5D=13111&city_id%5B%5D=13112&city_id%5B%5D=13113&city_id%5B%5D=13114&city_id%5B%5D=13115&city_id%5B%5D=13116&city_id%5B%5D=13117&city_id%5B%5D=13118&city_id%5B%5D=13119&city_id%5B%5D=13120&city_id%5B%5D=13121&city_id%5B%5D=13122&city_id%5B%5D=13123&designated_city_id=4&hw=1"
+
+# --frontier の記録の既定の有効期間（秒）。1日1回の定期実行では毎回取得し直し、短い間隔の再実行では取得しない
+DEFAULT_FRONTIER_TTL = 12 * 3600
 
-def extract_job_titles(url, page=1, all_titles=None, max_pages=50):
+def log(message):
+    # 標準出力は結果の出力に使うため、ログは標準エラー出力へ
+    print(message, file=sys.stderr, flush=True)
+
+# Words that indicate non-job title h3 elements
+IGNORE_WORDS = ['なるほど', '会員登録', '正社員', 'パート', 'バイト', 'スカウト', '希望', '会員限定']
+
+def parse_job_titles(html, page):
+    """1ページ分のHTMLから求人タイトルと次のページへのリンクを取り出す
+
+    (求人のリスト, 次ページのリンク先またはNone) を返す。
+    """
+    # Parse the HTML content
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Find job titles based on the structure of job-medley.com
+    # Look for h3 elements which typically contain job titles
+    job_listings = soup.find_all('h3')
+    
+    records = []
+    for listing in job_listings:
+        # Clean up the text (remove extra whitespace and newlines)
+        title = listing.text.strip()
+        
+        # Check if this is a real job title or navigation element
+        should_ignore = False
+        for word in IGNORE_WORDS:
+            if word in title:
+                should_ignore = True
+                break
+        
+        if title and not should_ignore:
+            records.append({'page': page, 'title': title})
+    
+    # 次のページへのリンクを複数の方法で探す
+    # 方法1: ページネーションリンクを探す
+    pagination_links = soup.select('div.pagination a, ul.pagination a, nav.pagination a')
+    for link in pagination_links:
+        link_text = link.text.strip()
+        href = link.get('href', '')
+        # 「次へ」「次のページ」などのテキストを持つリンクを探す
+        if '次' in link_text or page_number(href) == page + 1:
+            return records, href
+    
+    # 方法2: ページ番号のリンクから次のページを探す
+    page_num_links = soup.select('a[href*="page="]')
+    for link in page_num_links:
+        if page_number(link.get('href', '')) == page + 1:
+            return records, link.get('href')
+    
+    return records, None
+
+def parse_listing_title(html):
+    """求人1件の詳細ページのHTMLから求人タイトルを取り出す（見つからなければNone）"""
+    soup = BeautifulSoup(html, 'html.parser')
+    heading = soup.find('h1')
+    if heading and heading.text.strip():
+        return heading.text.strip()
+    og_title = soup.find('meta', attrs={'property': 'og:title'})
+    if og_title and og_title.get('content', '').strip():
+        return og_title['content'].strip()
+    if soup.title and soup.title.text.strip():
+        return soup.title.text.strip()
+    return None
+
+def extract_job_titles(url, page=1, all_titles=None, max_pages=50, fetcher=None,
+                       on_record=None, on_page=None, dedup=None, frontier=None):
+    """検索結果のページを順にたどって求人タイトルを抽出する
+
+    on_record(record) は求人を1件見つけるたびに、on_page(url, page, finished) は
+    1ページの処理が終わるたびに呼び出される（finished は最終ページかどうか）。
+    dedup（TitleDeduplicator）を渡すと、既出のタイトルは結果に含めない。
+    frontier（Frontier）を渡すと、取得済みのページに達した時点で終了する。
+    """
     if all_titles is None:
-        all_titles = []
+        all_titles = RecordStore()
+    if fetcher is None:
+        fetcher = Fetcher()
     
     # 最大ページ数を超えたら終了
     if page > max_pages:
-        print(f"最大ページ数 ({max_pages}) に達しました。抽出を終了します。")
+        log(f"最大ページ数 ({max_pages}) に達しました。抽出を終了します。")
         return all_titles
     
-    # ページパラメータを追加
-    if page > 1:
-        if '?' in url:
-            # すでにpage=Nがあれば置き換え、なければ追加
-            if 'page=' in url:
-                current_url = re.sub(r'page=\d+', f'page={page}', url)
-            else:
-                current_url = f"{url}&page={page}"
-        else:
-            current_url = f"{url}?page={page}"
-    else:
-        current_url = url
-    
-    print(f"ページ {page} を処理中... URL: {current_url}")
-    
-    # ランダムな遅延を追加してアクセス制限を回避
-    delay = random.uniform(1.5, 3.0)
-    time.sleep(delay)
-    
-    # Send a request to the URL
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'ja,en-US;q=0.7,en;q=0.3',
-        'Referer': 'https://job-medley.com/',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'Cache-Control': 'max-age=0',
-    }
+    current_url = page_url(url, page)
+    # 同じページを別の検索条件やURLの表記ですでに取得していれば、その先も取得済み
+    if frontier is not None and not frontier.add(current_url):
+        log(f"取得済みのページのため抽出を終了します: {current_url}")
+        return all_titles
+    log(f"ページ {page} を処理中... URL: {current_url}")
     
     try:
-        response = requests.get(current_url, headers=headers)
+        # ランダムな遅延を追加してアクセス制限を回避し、リクエストを送信
+        response = fetcher.fetch(current_url)
         
         # Check if the request was successful
         if response.status_code != 200:
-            print(f"ページの取得に失敗しました: ステータスコード {response.status_code}")
+            log(f"ページの取得に失敗しました: ステータスコード {response.status_code}")
+            if frontier is not None:
+                frontier.discard(current_url)
             return all_titles
         
-        # Parse the HTML content
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Find job titles based on the structure of job-medley.com
-        # Look for h3 elements which typically contain job titles
-        job_listings = soup.find_all('h3')
-        
-        # Words that indicate non-job title h3 elements
-        ignore_words = ['なるほど', '会員登録', '正社員', 'パート', 'バイト', 'スカウト', '希望', '会員限定']
+        records, next_href = parse_job_titles(response.text, page)
+        for record in records:
+            if dedup is not None and dedup.is_duplicate(record['title']):
+                continue
+            all_titles.append(record)
+            if on_record:
+                on_record(record)
         
         # 現在のページのタイトル数
-        page_titles_count = 0
+        page_titles_count = len(records)
+        log(f"  {page_titles_count} 件の求人を見つけました")
         
-        for listing in job_listings:
-            # Clean up the text (remove extra whitespace and newlines)
-            title = listing.text.strip()
-            
-            # Check if this is a real job title or navigation element
-            should_ignore = False
-            for word in ignore_words:
-                if word in title:
-                    should_ignore = True
-                    break
-            
-            if title and not should_ignore:
-                all_titles.append({'page': page, 'title': title})
-                page_titles_count += 1
-        
-        print(f"  {page_titles_count} 件の求人を見つけました")
-        
-        # 次のページへのリンクを複数の方法で探す
-        next_page = None
-        
-        # 方法1: ページネーションリンクを探す
-        pagination_links = soup.select('div.pagination a, ul.pagination a, nav.pagination a')
-        for link in pagination_links:
-            link_text = link.text.strip()
-            href = link.get('href', '')
-            # 「次へ」「次のページ」などのテキストを持つリンクを探す
-            if '次' in link_text or ('page=' in href and f'page={page+1}' in href):
-                next_page = link
-                print(f"  次のページへのリンクを見つけました: {link.get('href')}")
-                break
-        
-        # 方法2: ページ番号のリンクから次のページを探す
-        if not next_page:
-            page_num_links = soup.select('a[href*="page="]')
-            for link in page_num_links:
-                page_num_match = re.search(r'page=(\d+)', link.get('href', ''))
-                if page_num_match:
-                    found_page = int(page_num_match.group(1))
-                    if found_page == page + 1:
-                        next_page = link
-                        print(f"  次のページ({found_page})へのリンクを見つけました: {link.get('href')}")
-                        break
+        if on_page:
+            on_page(url, page, page_titles_count == 0)
         
         # 次のページが存在し、現在のページで求人が見つかった場合は続行
-        if next_page and page_titles_count > 0:
-            return extract_job_titles(url, page + 1, all_titles, max_pages)
+        if next_href and page_titles_count > 0:
+            log(f"  次のページへのリンクを見つけました: {next_href}")
+            return extract_job_titles(url, page + 1, all_titles, max_pages, fetcher, on_record, on_page, dedup, frontier)
         elif page_titles_count > 0:
             # 次のページへのリンクがないが、このページに求人がある場合は
             # 単純にページ番号を進めてみる
-            print("  明示的な次ページリンクが見つかりませんでしたが、次のページを試みます")
-            return extract_job_titles(url, page + 1, all_titles, max_pages)
+            log("  明示的な次ページリンクが見つかりませんでしたが、次のページを試みます")
+            return extract_job_titles(url, page + 1, all_titles, max_pages, fetcher, on_record, on_page, dedup, frontier)
         else:
-            print("最後のページに到達したか、次のページで求人が見つかりませんでした。抽出を終了します。")
+            log("最後のページに到達したか、次のページで求人が見つかりませんでした。抽出を終了します。")
             return all_titles
             
+    except FetchCancelled:
+        log("停止要求があったため処理を中断します。")
+        if frontier is not None:
+            frontier.discard(current_url)
+        return all_titles
     except Exception as e:
-        print(f"エラーが発生しました: {str(e)}")
+        log(f"エラーが発生しました: {str(e)}")
+        if frontier is not None:
+            frontier.discard(current_url)
         return all_titles
 
+def extract_job_titles_pipelined(url, page=1, max_pages=50, fetcher=None,
+                                 on_record=None, on_page=None, dedup=None, frontier=None):
+    """extract_job_titles と同じ処理を、取得と解析を並行させて行う
+
+    取得スレッドはレスポンスを受け取った時点で次のリクエストまでの遅延を
+    開始し、その間に呼び出し元のスレッドが前のページの解析・除外・出力を
+    行う。リクエストは1件ずつで、間隔も逐次版と同じ範囲に保たれる。
+    """
+    if fetcher is None:
+        fetcher = Fetcher()
+    
+    all_titles = RecordStore()
+    # 先読みは1ページまで。解析が遅れている間は取得スレッドが待つ
+    pages = queue.Queue(maxsize=1)
+    stop = threading.Event()
+    
+    def fetch_pages():
+        next_time = None
+        try:
+            for current_page in range(page, max_pages + 1):
+                current_url = page_url(url, current_page)
+                if frontier is not None and not frontier.add(current_url):
+                    log(f"取得済みのページのため抽出を終了します: {current_url}")
+                    return
+                try:
+                    response = fetcher.fetch(current_url, not_before=next_time, stop_event=stop)
+                except Exception:
+                    if frontier is not None:
+                        frontier.discard(current_url)
+                    raise
+                if response is None:
+                    if frontier is not None:
+                        frontier.discard(current_url)
+                    return
+                # 次のリクエストまでの遅延はレスポンスを受け取った時点から数える
+                next_time = time.monotonic() + random.uniform(fetcher.min_delay, fetcher.max_delay)
+                pages.put((current_page, current_url, response))
+                if stop.is_set():
+                    return
+            log(f"最大ページ数 ({max_pages}) に達しました。抽出を終了します。")
+        except FetchCancelled:
+            log("停止要求があったため処理を中断します。")
+        except Exception as e:
+            log(f"エラーが発生しました: {str(e)}")
+        finally:
+            pages.put(None)
+    
+    fetch_thread = threading.Thread(target=fetch_pages, daemon=True)
+    fetch_thread.start()
+    
+    while True:
+        item = pages.get()
+        if item is None:
+            break
+        if stop.is_set():
+            # 終了が決まった後に届いたページは読み捨てる
+            continue
+        
+        current_page, current_url, response = item
+        log(f"ページ {current_page} を処理中... URL: {current_url}")
+        try:
+            # Check if the request was successful
+            if response.status_code != 200:
+                log(f"ページの取得に失敗しました: ステータスコード {response.status_code}")
+                if frontier is not None:
+                    frontier.discard(current_url)
+                stop.set()
+                continue
+            
+            records, next_href = parse_job_titles(response.text, current_page)
+            for record in records:
+                if dedup is not None and dedup.is_duplicate(record['title']):
+                    continue
+                all_titles.append(record)
+                if on_record:
+                    on_record(record)
+            
+            log(f"  {len(records)} 件の求人を見つけました")
+            if on_page:
+                on_page(url, current_page, not records)
+            
+            if not records:
+                log("最後のページに到達したか、次のページで求人が見つかりませんでした。抽出を終了します。")
+                stop.set()
+            elif next_href:
+                log(f"  次のページへのリンクを見つけました: {next_href}")
+            else:
+                log("  明示的な次ページリンクが見つかりませんでしたが、次のページを試みます")
+        except Exception as e:
+            log(f"エラーが発生しました: {str(e)}")
+            stop.set()
+    
+    fetch_thread.join()
+    return all_titles
+
 def save_to_csv(job_titles, filename="job_medley_results.csv"):
     try:
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['page', 'title']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            writer.writeheader()
-            for title in job_titles:
-                writer.writerow(title)
+        if not isinstance(job_titles, RecordStore):
+            job_titles = RecordStore(job_titles)
+        job_titles.save_csv(filename)
         
-        print(f"結果を {filename} に保存しました。")
+        log(f"結果を {filename} に保存しました。")
         return True
     except Exception as e:
-        print(f"CSVファイルの保存中にエラーが発生しました: {str(e)}")
+        log(f"CSVファイルの保存中にエラーが発生しました: {str(e)}")
         return False
 
-def main(test_mode=True):
-    # URL from the provided example
-    url = "https://job-medley.com/ans/search/?job_category_code=ans&prefecture_id=13&city_id%5B%5D=13101&city_id%5B%5D=13102&city_id%5B%5D=13103&city_id%5B%5D=13104&city_id%5B%5D=13105&city_id%5B%5D=13106&city_id%5B%5D=13107&city_id%5B%5D=13108&city_id%5B%5D=13109&city_id%5B%5D=13110&city_id%5B%5D=13111&city_id%5B%5D=13112&city_id%5B%5D=13113&city_id%5B%5D=13114&city_id%5B%5D=13115&city_id%5B%5D=13116&city_id%5B%5D=13117&city_id%5B%5D=13118&city_id%5B%5D=13119&city_id%5B%5D=13120&city_id%5B%5D=13121&city_id%5B%5D=13122&city_id%5B%5D=13123&designated_city_id=4&hw=1"
+class RecordWriter:
+    """抽出した求人を見つけた順にファイルまたは標準出力へ書き出す"""
     
-    if test_mode:
-        print("テストモードで実行中...")
-        # テストモードでは3ページまで処理
-        max_pages = 3
-        filename = "test_job_medley_results.csv"
-    else:
-        print("本番モードで実行中...")
-        max_pages = 50  # 最大ページ数を設定
-        filename = "job_medley_results.csv"
+    def __init__(self, output='-', fmt='jsonl', append=False, include_url=False):
+        self.fmt = fmt
+        self.include_url = include_url
+        self._lock = threading.Lock()
+        
+        if output == '-':
+            self.file = sys.stdout
+            self._owns_file = False
+            has_content = False
+        else:
+            has_content = append and os.path.exists(output) and os.path.getsize(output) > 0
+            self.file = open(output, 'a' if append else 'w', newline='', encoding='utf-8')
+            self._owns_file = True
+        
+        if fmt == 'csv':
+            fieldnames = ['page', 'title']
+            if include_url:
+                fieldnames.append('url')
+            self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+            if not has_content:
+                self.writer.writeheader()
     
-    print("求人サイトから職場名を抽出しています...")
-    job_titles = extract_job_titles(url, max_pages=max_pages)
+    def write(self, record, url):
+        with self._lock:
+            if self.fmt == 'jsonl':
+                self.file.write(json.dumps({'url': url, **record}, ensure_ascii=False) + "\n")
+            else:
+                row = dict(record)
+                if self.include_url:
+                    row['url'] = url
+                self.writer.writerow(row)
+            # 後段のプロセスがすぐに読めるように1件ごとにフラッシュする
+            self.file.flush()
     
-    if job_titles:
-        print(f"\n合計 {len(job_titles)} 件の求人が見つかりました。")
-        
-        # ページごとの統計を表示
-        page_counts = {}
-        for title in job_titles:
-            page = title['page']
-            if page not in page_counts:
-                page_counts[page] = 0
-            page_counts[page] += 1
+    def close(self):
+        if self._owns_file:
+            self.file.close()
+
+class ResumeState:
+    """URLごとの処理済みページを記録し、中断したクロールを再開できるようにする"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.state = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.state = json.load(f)
+    
+    def start_page(self, url):
+        entry = self.state.get(url)
+        return entry['page'] + 1 if entry else 1
+    
+    def is_finished(self, url):
+        entry = self.state.get(url)
+        return bool(entry and entry['finished'])
+    
+    def mark(self, url, page, finished):
+        with self._lock:
+            self.state[url] = {'page': page, 'finished': finished}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+def crawl(urls, max_pages=50, fetcher=None, concurrency=1, on_record=None, resume=None,
+          pipelined=False, dedup=None, frontier=None):
+    """複数のURLを最大 concurrency 件ずつ並列にクロールし、URLごとの結果を返す
+
+    検索条件が重なっていても、同じページは frontier（省略時はこのクロール限りの
+    Frontier）によって一度しか取得しない。
+    """
+    if fetcher is None:
+        fetcher = Fetcher()
+    if frontier is None:
+        frontier = Frontier()
+    extract = extract_job_titles_pipelined if pipelined else extract_job_titles
+    
+    def crawl_one(url):
+        if resume and resume.is_finished(url):
+            log(f"処理済みのためスキップします: {url}")
+            return RecordStore()
+        start_page = resume.start_page(url) if resume else 1
+        record_callback = (lambda record: on_record(record, url)) if on_record else None
+        return extract(
+            url, page=start_page, max_pages=max_pages, fetcher=fetcher,
+            on_record=record_callback, on_page=resume.mark if resume else None, dedup=dedup,
+            frontier=frontier,
+        )
+    
+    results = {}
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = {url: executor.submit(crawl_one, url) for url in urls}
+        for url, future in futures.items():
+            results[url] = future.result()
+    except KeyboardInterrupt:
+        log("中断要求を受け付けました。処理を停止します...")
+        fetcher.cancel()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+    
+    return results
+
+def process_task(queue, task, fetcher, lease_seconds=LEASE_SECONDS):
+    """リース中のタスクを1件処理し、結果をキューに書き戻す"""
+    # 処理中はリース期間の1/3ごとにハートビートを送り、リースを延長する
+    done = threading.Event()
+    def heartbeat():
+        while not done.wait(lease_seconds / 3):
+            if not queue.heartbeat(task, lease_seconds):
+                log(f"  リースを失いました: {task.url} ページ {task.page}")
+                break
+        queue.close()
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+    
+    if task.kind == 'detail':
+        current_url = task.url
+        log(f"詳細ページを処理中... URL: {current_url}")
+    else:
+        current_url = page_url(task.url, task.page)
+        log(f"ページ {task.page} を処理中... URL: {current_url}")
+    try:
+        response = fetcher.fetch(current_url, kind=task.kind)
+        if response.status_code != 200:
+            log(f"ページの取得に失敗しました: ステータスコード {response.status_code}")
+            queue.fail(task, f"ステータスコード {response.status_code}")
+            return
         
-        print("\nページごとの求人数:")
-        for page, count in sorted(page_counts.items()):
-            print(f"  ページ {page}: {count} 件")
+        next_tasks = []
+        if task.kind == 'detail':
+            title = parse_listing_title(response.text)
+            records = [{'page': task.page, 'title': title}] if title else []
+            log(f"  求人タイトル: {title}" if title else "  求人タイトルが見つかりませんでした")
+        else:
+            records, _ = parse_job_titles(response.text, task.page)
+            log(f"  {len(records)} 件の求人を見つけました")
+            # 求人が見つかったページは続きのページをタスクとして登録する
+            if records and task.page < task.max_pages:
+                next_tasks.append((task.url, task.page + 1, task.max_pages))
         
-        # CSVに保存
-        save_success = save_to_csv(job_titles, filename)
+        if not queue.complete(task, records, next_tasks):
+            log("  リースが期限切れのため結果を破棄しました")
+    except FetchCancelled:
+        # 停止はタスクの失敗ではないため、試行回数を増やさずに返却する
+        queue.release(task)
+        raise
+    except Exception as e:
+        log(f"エラーが発生しました: {str(e)}")
+        queue.fail(task, e)
+    finally:
+        done.set()
+        heartbeat_thread.join()
+
+def run_queue_worker(queue, fetcher, worker_id=None, lease_seconds=LEASE_SECONDS, idle_timeout=30.0):
+    """共有キューからタスクを取得して処理し続ける
+
+    処理待ち・処理中のタスクがなくなるか、キューが空のまま idle_timeout 秒
+    経過すると終了する。処理したタスク数を返す。
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+    processed = 0
+    idle_since = None
+    try:
+        while not fetcher.cancelled:
+            task = queue.claim(worker_id, lease_seconds)
+            if task is None:
+                counts = queue.counts()
+                if counts and queue.is_drained():
+                    break
+                idle_since = idle_since or time.monotonic()
+                if time.monotonic() - idle_since > idle_timeout:
+                    break
+                fetcher.sleep(1.0)
+                continue
+            
+            idle_since = None
+            process_task(queue, task, fetcher, lease_seconds)
+            processed += 1
+    except FetchCancelled:
+        log("停止要求があったため処理を中断します。")
+    finally:
+        queue.close()
+    return processed
+
+def read_listings(path):
+    """詳細ページのURLの一覧を読み込む
+
+    jm_sitemap.py の出力（JSON Lines）と、URLを1行ずつ書いたファイルのどちらも読める。
+    """
+    urls = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            urls.append(json.loads(line)['url'] if line.startswith('{') else line)
+    return urls
+
+def run_coordinator(queue, urls, max_pages=50, poll_interval=5.0, dedup=None, listings=()):
+    """URLを共有キューに登録し、ワーカーの処理が終わるのを待って結果を返す
+
+    urls は検索結果のページをたどるタスクとして、listings は求人1件の詳細ページを
+    取得するタスクとして登録する。結果は今回登録したURLの分だけを返す。
+    同じキューのファイルを使い回した場合、以前の実行で完了したURLは結果を消して
+    取得し直す。
+    """
+    # 表記の違う同じ検索条件が二重に登録されないよう、正規化したURLで登録する
+    canonical_urls = {canonicalize(url)[0]: url for url in urls}
+    for canonical_url, url in canonical_urls.items():
+        if queue.enqueue(canonical_url, 1, max_pages, restart=True):
+            log(f"キューに登録しました: {url}")
+    canonical_listings = {canonicalize(url)[0]: url for url in listings}
+    registered = sum(queue.enqueue(canonical_url, kind='detail', restart=True)
+                     for canonical_url in canonical_listings)
+    if canonical_listings:
+        log(f"詳細ページ {len(canonical_listings)} 件のうち {registered} 件をキューに登録しました。")
+    canonical_urls.update(canonical_listings)
+    
+    while not queue.is_drained():
+        counts = queue.counts()
+        log(f"待機中... 未処理 {counts.get('pending', 0)} 件 / 処理中 {counts.get('leased', 0)} 件 / "
+            f"完了 {counts.get('done', 0)} 件 / 失敗 {counts.get('failed', 0)} 件")
+        time.sleep(poll_interval)
+    
+    results = {url: RecordStore() for url in canonical_urls.values()}
+    for url, record in queue.iter_results(canonical_urls.keys()):
+        if dedup is not None and dedup.is_duplicate(record['title']):
+            continue
+        results.setdefault(canonical_urls.get(url, url), RecordStore()).append(record)
+    return results
+
+def _replay_entry(args):
+    # ProcessPoolExecutor から呼ばれるため、モジュールの最上位に置く
+    archive_dir, entry = args
+    url, page = canonicalize(entry['url'])
+    html = read_entry(archive_dir, entry)
+    if entry.get('kind') == 'detail':
+        # 詳細ページは process_task と同じく1件の求人として抽出する
+        title = parse_listing_title(html)
+        return url, [{'page': page, 'title': title}] if title else []
+    records, _ = parse_job_titles(html, page)
+    return url, records
+
+def replay_archive(archive_dir, on_record=None, jobs=None, dedup=None):
+    """アーカイブ済みのHTMLから通信せずに求人を抽出し直し、URLごとの結果を返す
+
+    抽出は jobs 個のプロセスで並列に行う（省略時はCPUコア数）。
+    """
+    entries = [entry for entry in read_index(archive_dir) if entry['status_code'] == 200]
+    # 出力がURL・ページ順になるように並べておく
+    entries.sort(key=lambda entry: canonicalize(entry['url']))
+    log(f"アーカイブから {len(entries)} ページを再抽出します...")
+    
+    results = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        tasks = [(archive_dir, entry) for entry in entries]
+        for url, records in executor.map(_replay_entry, tasks, chunksize=16):
+            job_titles = results.setdefault(url, RecordStore())
+            for record in records:
+                if dedup is not None and dedup.is_duplicate(record['title']):
+                    continue
+                job_titles.append(record)
+                if on_record:
+                    on_record(record, url)
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Job Medleyの検索結果から職場名を抽出します。")
+    parser.add_argument('urls', nargs='*', default=None,
+                        help="検索結果のURL（複数指定可、省略時は東京23区の看護師/准看護師求人）")
+    parser.add_argument('--max-pages', type=int, default=50, help="URLごとの最大ページ数（デフォルト: 50）")
+    parser.add_argument('--test', action='store_true', help="テストモード（3ページまで処理）")
+    parser.add_argument('-c', '--concurrency', type=int, default=1, help="同時にクロールするURL数（デフォルト: 1）")
+    parser.add_argument('--rate', type=float, default=None, help="全体のリクエスト数の上限（件/秒）")
+    parser.add_argument('--min-delay', type=float, default=1.5, help="リクエスト前の最小遅延（秒）")
+    parser.add_argument('--max-delay', type=float, default=3.0, help="リクエスト前の最大遅延（秒）")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="取得と解析・出力を並行させる（リクエストは1件ずつのまま、待ち時間に解析する）")
+    parser.add_argument('--dedup', action='store_true',
+                        help="全角・半角や空白、括弧の違いを無視して重複するタイトルを除外する（全URL共通）")
+    parser.add_argument('--near-dup', type=float, nargs='?', const=0.8, default=None, metavar='THRESHOLD',
+                        help="類似度がしきい値（デフォルト: 0.8）以上のタイトルも重複として除外する")
+    parser.add_argument('--cache-dir', default=None, help="取得したページをキャッシュするディレクトリ")
+    parser.add_argument('--cache-ttl', type=float, default=None, help="キャッシュの有効期間（秒、省略時は無期限）")
+    parser.add_argument('--resume', metavar='STATE_FILE', default=None,
+                        help="処理済みページを記録するファイル。指定すると前回の続きから再開し、出力は追記される")
+    parser.add_argument('--frontier', metavar='DB', default=None,
+                        help="取得済みのページを記録するSQLiteファイル。指定すると実行をまたいで同じページを取得しない")
+    parser.add_argument('--frontier-ttl', type=float, default=DEFAULT_FRONTIER_TTL,
+                        help="--frontier の記録の有効期間（秒、デフォルト: 43200）。有効期間内に同じ検索条件で"
+                             "再実行すると1ページ目から取得済みとしてスキップされ、何も出力されない。"
+                             "過ぎたページは再び取得する")
+    parser.add_argument('--archive', metavar='DIR', default=None,
+                        help="取得した生のHTML（キャッシュから読み込んだページも含む）を圧縮して保存するディレクトリ")
+    parser.add_argument('--archive-codec', choices=sorted(CODEC_EXTENSIONS), default=None,
+                        help="アーカイブの圧縮形式（省略時は zstandard があれば zstd、なければ gzip）")
+    parser.add_argument('--replay', metavar='DIR', default=None,
+                        help="通信せずにアーカイブ済みのHTMLから抽出し直す")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="--replay で抽出に使うプロセス数（省略時はCPUコア数）")
+    parser.add_argument('--queue', metavar='DB', default=None,
+                        help="分散クロールで共有するキューのSQLiteファイル")
+    parser.add_argument('--listings', metavar='FILE', default=None,
+                        help="--queue で詳細ページのタスクとして登録するURLの一覧（jm_sitemap.py の出力またはURLを1行ずつ）")
+    parser.add_argument('--role', choices=['coordinator', 'worker'], default='coordinator',
+                        help="--queue 使用時の役割。coordinator はURLを登録して結果を出力し、worker はタスクを処理する")
+    parser.add_argument('--lease', type=float, default=LEASE_SECONDS, help="タスクのリース期間（秒）")
+    parser.add_argument('--idle-timeout', type=float, default=30.0,
+                        help="worker がタスクを待つ最大時間（秒）")
+    parser.add_argument('--profile', action='store_true',
+                        help="CPUとメモリのプロファイルを記録する（保存先は結果のファイルと同じ場所）")
+    parser.add_argument('--profile-prefix', metavar='PATH', default=None,
+                        help="プロファイルの保存先（ファイル名の先頭部分。指定すると --profile も有効になる）")
+    parser.add_argument('-f', '--format', choices=['csv', 'jsonl'], default='csv', help="出力形式（デフォルト: csv）")
+    parser.add_argument('-o', '--output', default=None,
+                        help="出力先（'-' で標準出力。デフォルトは csv ならファイル、jsonl なら標準出力）")
+    
+    args = parser.parse_args(argv)
+    if args.test:
+        args.max_pages = 3
+    if args.max_pages <= 0:
+        parser.error("最大ページ数は1以上の整数を指定してください。")
+    if args.concurrency <= 0:
+        parser.error("同時実行数は1以上の整数を指定してください。")
+    if args.frontier_ttl <= 0:
+        parser.error("--frontier-ttl は0より大きい値を指定してください。")
+    if args.jobs is not None and args.jobs <= 0:
+        parser.error("プロセス数は1以上の整数を指定してください。")
+    if args.rate is not None and args.rate <= 0:
+        parser.error("レート制限は0より大きい値を指定してください。")
+    if args.near_dup is not None:
+        if not 0 < args.near_dup <= 1:
+            parser.error("類似度のしきい値は0より大きく1以下の値を指定してください。")
+        args.dedup = True
+    if args.listings and not args.queue:
+        parser.error("--listings は --queue と一緒に指定してください。")
+    if not args.urls:
+        # 詳細ページだけを登録する場合は、既定の検索結果はたどらない
+        args.urls = [] if args.listings else [DEFAULT_URL]
+    if args.profile_prefix is not None:
+        args.profile = True
+    if args.output is None:
+        if args.format == 'jsonl':
+            args.output = '-'
+        else:
+            args.output = "test_job_medley_results.csv" if args.test else "job_medley_results.csv"
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.profile:
+        return run(args)
+    
+    base = args.profile_prefix or (os.path.splitext(args.output)[0] if args.output != '-' else 'jm_scraping')
+    profiler = RunProfiler(profile_prefix(base), all_threads=True)
+    try:
+        with profiler:
+            return run(args)
+    finally:
+        log(f"プロファイルを保存しました: {', '.join(profiler.paths)}")
+
+def run(args):
+    fetcher = Fetcher(
+        min_delay=args.min_delay,
+        max_delay=args.max_delay,
+        rate_limiter=RateLimiter(args.rate) if args.rate else None,
+        cache=ResponseCache(args.cache_dir, args.cache_ttl) if args.cache_dir else None,
+        archive=HtmlArchive(args.archive, args.archive_codec) if args.archive else None,
+    )
+    
+    if args.queue and args.role == 'worker':
+        queue = WorkQueue(args.queue)
+        log(f"ワーカーとしてキュー {args.queue} のタスクを処理します...")
+        executor = ThreadPoolExecutor(max_workers=args.concurrency)
+        try:
+            futures = [executor.submit(run_queue_worker, queue, fetcher, None, args.lease, args.idle_timeout)
+                       for _ in range(args.concurrency)]
+            processed = sum(future.result() for future in futures)
+        except KeyboardInterrupt:
+            log("中断要求を受け付けました。処理を停止します...")
+            fetcher.cancel()
+            return 130
+        finally:
+            executor.shutdown(wait=True)
+            fetcher.close()
+        log(f"{processed} 件のタスクを処理しました。")
+        return 0
+    
+    resume = ResumeState(args.resume) if args.resume else None
+    dedup = None
+    if args.dedup:
+        dedup = TitleDeduplicator(near_duplicates=args.near_dup is not None,
+                                  threshold=args.near_dup or 0.8)
+    writer = RecordWriter(args.output, args.format, append=resume is not None,
+                          include_url=len(args.urls) > 1 or args.replay is not None or args.listings is not None)
+    
+    log("求人サイトから職場名を抽出しています...")
+    try:
+        if args.replay:
+            results = replay_archive(args.replay, on_record=writer.write, jobs=args.jobs, dedup=dedup)
+        elif args.queue:
+            listings = read_listings(args.listings) if args.listings else ()
+            results = run_coordinator(WorkQueue(args.queue), args.urls, args.max_pages, dedup=dedup,
+                                      listings=listings)
+            for url, job_titles in results.items():
+                for record in job_titles:
+                    writer.write(record, url)
+        else:
+            frontier = Frontier(args.frontier, args.frontier_ttl) if args.frontier else None
+            results = crawl(args.urls, args.max_pages, fetcher, args.concurrency, on_record=writer.write,
+                            resume=resume, pipelined=args.pipeline, dedup=dedup, frontier=frontier)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        writer.close()
+        fetcher.close()
+    
+    total = 0
+    for url, job_titles in results.items():
+        if not job_titles:
+            continue
+        total += len(job_titles)
         
-        if save_success and test_mode:
-            print("テストが成功しました。本番モードで実行します...")
-            main(test_mode=False)
+        # ページごとの統計を表示
+        if len(results) > 1:
+            log(f"\nURL: {url}")
+        log("\nページごとの求人数:")
+        for page, count in job_titles.sorted_page_counts():
+            log(f"  ページ {page}: {count} 件")
+    
+    if total:
+        log(f"\n合計 {total} 件の求人が見つかりました。")
+        if dedup is not None:
+            log(f"重複する {dedup.duplicate_count} 件の求人タイトルを除外しました。")
+        if args.output != '-':
+            log(f"結果を {args.output} に保存しました。")
+        return 0
     else:
-        print("求人情報が見つかりませんでした。")
+        log("求人情報が見つかりませんでした。")
+        if args.frontier and not args.queue and not args.replay:
+            log(f"--frontier {args.frontier} に記録されたページは有効期間（{args.frontier_ttl:g} 秒）内は取得しません。"
+                "再取得するには --frontier-ttl を短くするか、記録のファイルを削除してください。")
+        return 1
 
-# テストモードで実行
 if __name__ == "__main__":
-    main(test_mode=True)
+    sys.exit(main())
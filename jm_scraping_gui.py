@@ -1,70 +1,55 @@
-import requests
-from bs4 import BeautifulSoup
-import re
-import csv
-import time
-import random
-import os
 import threading
 import queue
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext, messagebox
 from datetime import datetime
 
+# スクレイピング処理（requests、BeautifulSoup など）はウィンドウの表示を待たせないよう
+# 起動時には読み込まず、表示後にバックグラウンドで読み込む（jm_preload）
+from jm_preload import preload_engine
+
 class JobScraper:
-    def __init__(self):
+    def __init__(self, min_delay=1.5, max_delay=3.0):
         self.log_queue = queue.Queue()
-        self.job_titles = []
+        self.job_titles = None
         self.is_running = False
         self.should_stop = False
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.fetcher = None
+        self.dedup = None
+        self.frontier = None
     
     def log(self, message):
         timestamp = datetime.now().strftime("%H:%M:%S")
         self.log_queue.put(f"[{timestamp}] {message}")
     
     def extract_job_titles(self, url, page=1, max_pages=50):
+        from bs4 import BeautifulSoup
+        from jm_fetch import FetchCancelled
+        from jm_frontier import page_url, page_number
+        
         # 最大ページ数を超えたら終了
         if page > max_pages or self.should_stop:
             self.log(f"最大ページ数 ({max_pages}) に達したか、停止要求があったため抽出を終了します。")
             return
         
-        # ページパラメータを追加
-        if page > 1:
-            if '?' in url:
-                # すでにpage=Nがあれば置き換え、なければ追加
-                if 'page=' in url:
-                    current_url = re.sub(r'page=\d+', f'page={page}', url)
-                else:
-                    current_url = f"{url}&page={page}"
-            else:
-                current_url = f"{url}?page={page}"
-        else:
-            current_url = url
+        current_url = page_url(url, page)
+        # 同じページをURLの表記を変えて取得し直さない
+        if not self.frontier.add(current_url):
+            self.log(f"取得済みのページのため抽出を終了します: {current_url}")
+            return
         
         self.log(f"ページ {page} を処理中... URL: {current_url}")
         
-        # ランダムな遅延を追加してアクセス制限を回避
-        delay = random.uniform(1.5, 3.0)
-        time.sleep(delay)
-        
-        # Send a request to the URL
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'ja,en-US;q=0.7,en;q=0.3',
-            'Referer': 'https://job-medley.com/',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Cache-Control': 'max-age=0',
-        }
-        
         try:
-            response = requests.get(current_url, headers=headers)
+            # ランダムな遅延を追加してアクセス制限を回避し、リクエストを送信
+            response = self.fetcher.fetch(current_url)
             
             # Check if the request was successful
             if response.status_code != 200:
                 self.log(f"ページの取得に失敗しました: ステータスコード {response.status_code}")
+                self.frontier.discard(current_url)
                 return
             
             # Parse the HTML content
@@ -96,8 +81,11 @@ class JobScraper:
                         break
                 
                 if title and not should_ignore:
-                    self.job_titles.append({'page': page, 'title': title})
                     page_titles_count += 1
+                    # 重複するタイトルは見つけた時点で除外する
+                    if self.dedup is not None and self.dedup.is_duplicate(title):
+                        continue
+                    self.job_titles.add(page, title)
             
             self.log(f"  {page_titles_count} 件の求人を見つけました")
             
@@ -110,7 +98,7 @@ class JobScraper:
                 link_text = link.text.strip()
                 href = link.get('href', '')
                 # 「次へ」「次のページ」などのテキストを持つリンクを探す
-                if '次' in link_text or ('page=' in href and f'page={page+1}' in href):
+                if '次' in link_text or page_number(href) == page + 1:
                     next_page = link
                     self.log(f"  次のページへのリンクを見つけました: {link.get('href')}")
                     break
@@ -119,13 +107,11 @@ class JobScraper:
             if not next_page:
                 page_num_links = soup.select('a[href*="page="]')
                 for link in page_num_links:
-                    page_num_match = re.search(r'page=(\d+)', link.get('href', ''))
-                    if page_num_match:
-                        found_page = int(page_num_match.group(1))
-                        if found_page == page + 1:
-                            next_page = link
-                            self.log(f"  次のページ({found_page})へのリンクを見つけました: {link.get('href')}")
-                            break
+                    found_page = page_number(link.get('href', ''))
+                    if found_page == page + 1:
+                        next_page = link
+                        self.log(f"  次のページ({found_page})へのリンクを見つけました: {link.get('href')}")
+                        break
             
             # 次のページが存在し、現在のページで求人が見つかった場合は続行
             if next_page and page_titles_count > 0 and not self.should_stop:
@@ -138,18 +124,16 @@ class JobScraper:
             else:
                 self.log("最後のページに到達したか、次のページで求人が見つかりませんでした。抽出を終了します。")
                 
+        except FetchCancelled:
+            self.log("停止要求があったため処理を中断します。")
+            self.frontier.discard(current_url)
         except Exception as e:
             self.log(f"エラーが発生しました: {str(e)}")
+            self.frontier.discard(current_url)
     
     def save_to_csv(self, filename):
         try:
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['page', 'title']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                
-                writer.writeheader()
-                for title in self.job_titles:
-                    writer.writerow(title)
+            self.job_titles.save_csv(filename)
             
             self.log(f"結果を {filename} に保存しました。")
             return True
@@ -157,29 +141,45 @@ class JobScraper:
             self.log(f"CSVファイルの保存中にエラーが発生しました: {str(e)}")
             return False
     
-    def start_scraping(self, url, max_pages=50):
+    def start_scraping(self, url, max_pages=50, remove_duplicates=True, remove_near_duplicates=False):
         self.should_stop = False
         self.is_running = True
-        self.job_titles = []
+        
+        # 読み込みが終わっていなければ、ここで終わるまで待つ
+        from jm_fetch import Fetcher
+        from jm_dedup import TitleDeduplicator
+        from jm_records import RecordStore
+        from jm_frontier import Frontier
+        from jm_profile import env_profiler
+        
+        if self.fetcher is None:
+            self.fetcher = Fetcher(min_delay=self.min_delay, max_delay=self.max_delay)
+        self.fetcher.reset()
+        self.job_titles = RecordStore()
+        self.frontier = Frontier()
+        self.dedup = None
+        if remove_duplicates:
+            # 全角・半角や空白、括弧の違いを無視して重複を判定する
+            self.dedup = TitleDeduplicator(near_duplicates=remove_near_duplicates)
         
         self.log("求人サイトから職場名を抽出を開始します...")
-        self.extract_job_titles(url, max_pages=max_pages)
+        # 環境変数 JM_PROFILE が設定されている場合はプロファイルを記録する
+        with env_profiler('jm_scraping_gui') as profiler:
+            self.extract_job_titles(url, max_pages=max_pages)
+        if profiler is not None:
+            self.log(f"プロファイルを保存しました: {', '.join(profiler.paths)}")
         
         self.is_running = False
         
         if self.job_titles:
             # ページごとの統計を表示
-            page_counts = {}
-            for title in self.job_titles:
-                page = title['page']
-                if page not in page_counts:
-                    page_counts[page] = 0
-                page_counts[page] += 1
+            if self.dedup is not None:
+                self.log(f"重複する {self.dedup.duplicate_count} 件の求人タイトルを削除しました。")
             
             self.log(f"\n合計 {len(self.job_titles)} 件の求人が見つかりました。")
             
             self.log("\nページごとの求人数:")
-            for page, count in sorted(page_counts.items()):
+            for page, count in self.job_titles.sorted_page_counts():
                 self.log(f"  ページ {page}: {count} 件")
             
             return True
@@ -189,6 +189,8 @@ class JobScraper:
     
     def stop_scraping(self):
         self.should_stop = True
+        if self.fetcher is not None:
+            self.fetcher.cancel()
         self.log("停止要求を受け付けました。処理を停止します...")
 
 
@@ -226,6 +228,14 @@ class ScraperGUI:
         self.max_pages_var = tk.StringVar(value="50")
         ttk.Entry(settings_frame, textvariable=self.max_pages_var, width=5).pack(side=tk.LEFT, padx=5)
         
+        # 重複削除オプション
+        self.remove_duplicates_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(settings_frame, text="重複する求人タイトルを削除",
+                        variable=self.remove_duplicates_var).pack(side=tk.LEFT, padx=(20, 5))
+        self.remove_near_duplicates_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="類似するタイトルも削除",
+                        variable=self.remove_near_duplicates_var).pack(side=tk.LEFT, padx=5)
+        
         # ボタンエリア
         button_frame = ttk.Frame(main_frame)
         button_frame.pack(fill=tk.X, pady=5)
@@ -298,7 +308,8 @@ class ScraperGUI:
             return
         
         # 別スレッドでスクレイピングを実行
-        threading.Thread(target=self.scraper.start_scraping, args=(url, max_pages), daemon=True).start()
+        args = (url, max_pages, self.remove_duplicates_var.get(), self.remove_near_duplicates_var.get())
+        threading.Thread(target=self.scraper.start_scraping, args=args, daemon=True).start()
     
     def stop_scraping(self):
         self.scraper.stop_scraping()
@@ -324,4 +335,6 @@ class ScraperGUI:
 if __name__ == "__main__":
     root = tk.Tk()
     app = ScraperGUI(root)
+    # ウィンドウの描画が済んでからスクレイピング処理を読み込み始める
+    root.after_idle(preload_engine)
     root.mainloop() 
\ No newline at end of file
@@ -5,36 +5,46 @@ import os
 os.environ['QT_MAC_WANTS_LAYER'] = '1'
 os.environ['QT_QPA_PLATFORM'] = 'cocoa'  # macOS特有の設定
 
-import requests
-from bs4 import BeautifulSoup
-import re
-import csv
-import time
 import random
-import threading
 from datetime import datetime
 
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QProgressBar, QTextEdit, QFileDialog,
-    QLineEdit, QFrame, QGroupBox, QSplitter, QMessageBox, QCheckBox
+    QLineEdit, QGroupBox, QMessageBox, QCheckBox
 )
-from PyQt5.QtCore import QThread, pyqtSignal, Qt, QUrl
-from PyQt5.QtGui import QFont, QDesktopServices
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QFont
+
+# スクレイピング処理（requests、BeautifulSoup など）はウィンドウの表示を待たせないよう
+# 起動時には読み込まず、表示後にバックグラウンドで読み込む（jm_preload）
+from jm_preload import preload_engine
+
+def stop_wait_ms():
+    """停止要求からワーカースレッド終了までの待機上限（ミリ秒）
+
+    通信中のリクエストは停止要求で接続を切断するため、接続中だった場合の
+    接続タイムアウトに余裕を加えた時間内に終了する
+    """
+    from jm_fetch import CONNECT_TIMEOUT
+    return int((CONNECT_TIMEOUT + 1.0) * 1000)
 
 class ScrapingWorker(QThread):
     progress_updated = pyqtSignal(str, int, int)  # page_number, current, total
     log_updated = pyqtSignal(str)
-    finished = pyqtSignal(list)  # 求人リストを渡す
+    finished = pyqtSignal(object)  # 求人の RecordStore を渡す
     error_occurred = pyqtSignal(str)
 
-    def __init__(self, url, max_pages=50, remove_duplicates=True):
+    def __init__(self, url, max_pages=50, remove_duplicates=True, remove_near_duplicates=False):
         super().__init__()
         self.url = url
         self.max_pages = max_pages
         self.stop_requested = False
-        self.job_titles = []
+        self.job_titles = None
         self.remove_duplicates = remove_duplicates
+        self.remove_near_duplicates = remove_near_duplicates
+        self.dedup = None
+        self.frontier = None
         
         # アクセス制限回避のためのランダム遅延
         self.min_delay = 1.5
@@ -48,55 +58,41 @@ class ScrapingWorker(QThread):
             'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36',
             'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36'
         ]
+        
+        # 取得処理はワーカースレッドの開始時に作る
+        self.fetcher = None
 
     def get_random_user_agent(self):
         """ランダムなUser-Agentを返す"""
         return random.choice(self.user_agents)
 
     def extract_job_titles(self, url, page=1):
+        from bs4 import BeautifulSoup
+        from jm_fetch import FetchCancelled
+        from jm_frontier import page_url, page_number
+        
         # 最大ページ数を超えたら終了
         if page > self.max_pages or self.stop_requested:
             self.log_updated.emit(f"最大ページ数 ({self.max_pages}) に達したか、停止要求があったため抽出を終了します。")
             return
         
-        # ページパラメータを追加
-        if page > 1:
-            if '?' in url:
-                # すでにpage=Nがあれば置き換え、なければ追加
-                if 'page=' in url:
-                    current_url = re.sub(r'page=\d+', f'page={page}', url)
-                else:
-                    current_url = f"{url}&page={page}"
-            else:
-                current_url = f"{url}?page={page}"
-        else:
-            current_url = url
+        current_url = page_url(url, page)
+        # 同じページをURLの表記を変えて取得し直さない
+        if not self.frontier.add(current_url):
+            self.log_updated.emit(f"取得済みのページのため抽出を終了します: {current_url}")
+            return
         
         self.log_updated.emit(f"ページ {page} を処理中... URL: {current_url}")
         self.progress_updated.emit(f"ページ {page}", page, self.max_pages)
         
-        # ランダムな遅延を追加してアクセス制限を回避
-        delay = random.uniform(self.min_delay, self.max_delay)
-        time.sleep(delay)
-        
-        # Send a request to the URL
-        headers = {
-            'User-Agent': self.get_random_user_agent(),
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'ja,en-US;q=0.7,en;q=0.3',
-            'Referer': 'https://job-medley.com/',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Cache-Control': 'max-age=0',
-        }
-        
         try:
-            response = requests.get(current_url, headers=headers)
+            # ランダムな遅延を追加してアクセス制限を回避し、リクエストを送信
+            response = self.fetcher.fetch(current_url, headers={'User-Agent': self.get_random_user_agent()})
             
             # Check if the request was successful
             if response.status_code != 200:
                 self.log_updated.emit(f"ページの取得に失敗しました: ステータスコード {response.status_code}")
+                self.frontier.discard(current_url)
                 return
             
             # Parse the HTML content
@@ -128,8 +124,11 @@ class ScrapingWorker(QThread):
                         break
                 
                 if title and not should_ignore:
-                    self.job_titles.append({'page': page, 'title': title})
                     page_titles_count += 1
+                    # 重複するタイトルは見つけた時点で除外する
+                    if self.dedup is not None and self.dedup.is_duplicate(title):
+                        continue
+                    self.job_titles.add(page, title)
             
             self.log_updated.emit(f"  {page_titles_count} 件の求人を見つけました")
             
@@ -142,7 +141,7 @@ class ScrapingWorker(QThread):
                 link_text = link.text.strip()
                 href = link.get('href', '')
                 # 「次へ」「次のページ」などのテキストを持つリンクを探す
-                if '次' in link_text or ('page=' in href and f'page={page+1}' in href):
+                if '次' in link_text or page_number(href) == page + 1:
                     next_page = link
                     self.log_updated.emit(f"  次のページへのリンクを見つけました: {link.get('href')}")
                     break
@@ -151,13 +150,11 @@ class ScrapingWorker(QThread):
             if not next_page:
                 page_num_links = soup.select('a[href*="page="]')
                 for link in page_num_links:
-                    page_num_match = re.search(r'page=(\d+)', link.get('href', ''))
-                    if page_num_match:
-                        found_page = int(page_num_match.group(1))
-                        if found_page == page + 1:
-                            next_page = link
-                            self.log_updated.emit(f"  次のページ({found_page})へのリンクを見つけました: {link.get('href')}")
-                            break
+                    found_page = page_number(link.get('href', ''))
+                    if found_page == page + 1:
+                        next_page = link
+                        self.log_updated.emit(f"  次のページ({found_page})へのリンクを見つけました: {link.get('href')}")
+                        break
             
             # 次のページが存在し、現在のページで求人が見つかった場合は続行
             if next_page and page_titles_count > 0 and not self.stop_requested:
@@ -168,68 +165,68 @@ class ScrapingWorker(QThread):
                 self.log_updated.emit("  明示的な次ページリンクが見つかりませんでしたが、次のページを試みます")
                 self.extract_job_titles(url, page + 1)
                 
+        except FetchCancelled:
+            self.log_updated.emit("停止要求があったため処理を中断します。")
+            self.frontier.discard(current_url)
         except Exception as e:
             self.log_updated.emit(f"エラーが発生しました: {str(e)}")
+            self.frontier.discard(current_url)
             self.error_occurred.emit(f"エラーが発生しました: {str(e)}")
 
-    def remove_duplicate_titles(self, job_titles):
-        """タイトルが重複している求人を削除し、ユニークなリストを返す"""
-        self.log_updated.emit("重複する求人タイトルを削除しています...")
-        
-        unique_titles = []
-        seen_titles = set()
-        
-        for job in job_titles:
-            title = job['title']
-            if title not in seen_titles:
-                seen_titles.add(title)
-                unique_titles.append(job)
-                
-        removed_count = len(job_titles) - len(unique_titles)
-        self.log_updated.emit(f"重複する {removed_count} 件の求人タイトルを削除しました。")
-        
-        return unique_titles
-
     def run(self):
+        from jm_records import RecordStore
         try:
             self.log_updated.emit("求人サイトから職場名を抽出を開始します...")
-            self.job_titles = []
-            self.extract_job_titles(self.url)
+            # 読み込みが終わっていなければ、ここで終わるまで待つ
+            from jm_fetch import Fetcher
+            from jm_dedup import TitleDeduplicator
+            from jm_frontier import Frontier
+            from jm_profile import env_profiler
+            
+            self.fetcher = Fetcher(min_delay=self.min_delay, max_delay=self.max_delay)
+            if self.stop_requested:
+                # 読み込みを待つ間に停止要求があった場合
+                self.fetcher.cancel()
+            self.job_titles = RecordStore()
+            self.frontier = Frontier()
+            self.dedup = None
+            if self.remove_duplicates:
+                # 全角・半角や空白、括弧の違いを無視して重複を判定する
+                self.dedup = TitleDeduplicator(near_duplicates=self.remove_near_duplicates)
+            # 環境変数 JM_PROFILE が設定されている場合はプロファイルを記録する
+            with env_profiler('jm_scraping_qt') as profiler:
+                self.extract_job_titles(self.url)
+            if profiler is not None:
+                self.log_updated.emit(f"プロファイルを保存しました: {', '.join(profiler.paths)}")
             
             if self.job_titles:
-                # 重複を削除する場合
-                if self.remove_duplicates:
-                    original_count = len(self.job_titles)
-                    self.job_titles = self.remove_duplicate_titles(self.job_titles)
-                    self.log_updated.emit(f"元の求人数: {original_count}件、ユニークな求人数: {len(self.job_titles)}件")
-                
-                # ページごとの統計を計算
-                page_counts = {}
-                for title in self.job_titles:
-                    page = title['page']
-                    if page not in page_counts:
-                        page_counts[page] = 0
-                    page_counts[page] += 1
+                # 重複を削除した場合
+                if self.dedup is not None:
+                    removed_count = self.dedup.duplicate_count
+                    self.log_updated.emit(f"重複する {removed_count} 件の求人タイトルを削除しました。")
+                    self.log_updated.emit(f"元の求人数: {len(self.job_titles) + removed_count}件、ユニークな求人数: {len(self.job_titles)}件")
                 
                 self.log_updated.emit(f"\n合計 {len(self.job_titles)} 件の求人が見つかりました。")
                 
                 self.log_updated.emit("\nページごとの求人数:")
-                for page, count in sorted(page_counts.items()):
+                for page, count in self.job_titles.sorted_page_counts():
                     self.log_updated.emit(f"  ページ {page}: {count} 件")
                 
                 # 結果を返す
                 self.finished.emit(self.job_titles)
             else:
                 self.log_updated.emit("求人情報が見つかりませんでした。")
-                self.finished.emit([])
+                self.finished.emit(RecordStore())
                 
         except Exception as e:
             self.log_updated.emit(f"処理中にエラーが発生しました: {str(e)}")
             self.error_occurred.emit(f"処理中にエラーが発生しました: {str(e)}")
-            self.finished.emit([])
+            self.finished.emit(RecordStore())
             
     def stop(self):
         self.stop_requested = True
+        if self.fetcher is not None:
+            self.fetcher.cancel()
         self.log_updated.emit("停止要求を受け付けました。処理を停止します...")
 
 
@@ -237,7 +234,11 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.scraping_worker = None
-        self.job_titles = []
+        self.job_titles = None
+        # 終了が要求され、ワーカースレッドの停止を待っている間は True
+        self.close_pending = False
+        # 停止の待機上限を過ぎた場合は True（スレッドの終了を待たずに閉じる）
+        self.stop_timed_out = False
         self.initUI()
         
     def initUI(self):
@@ -276,6 +277,11 @@ class MainWindow(QMainWindow):
         self.remove_duplicates_checkbox.setChecked(True)
         settings_layout.addWidget(self.remove_duplicates_checkbox)
         
+        self.remove_near_duplicates_checkbox = QCheckBox("類似するタイトルも削除")
+        self.remove_near_duplicates_checkbox.setChecked(False)
+        self.remove_duplicates_checkbox.toggled.connect(self.remove_near_duplicates_checkbox.setEnabled)
+        settings_layout.addWidget(self.remove_near_duplicates_checkbox)
+        
         settings_layout.addStretch(1)
         settings_group.setLayout(settings_layout)
         main_layout.addWidget(settings_group)
@@ -363,9 +369,10 @@ class MainWindow(QMainWindow):
         
         # 重複削除オプションの取得
         remove_duplicates = self.remove_duplicates_checkbox.isChecked()
+        remove_near_duplicates = self.remove_near_duplicates_checkbox.isChecked()
         
         # ワーカーの設定と開始
-        self.scraping_worker = ScrapingWorker(url, max_pages, remove_duplicates)
+        self.scraping_worker = ScrapingWorker(url, max_pages, remove_duplicates, remove_near_duplicates)
         self.scraping_worker.log_updated.connect(self.log)
         self.scraping_worker.progress_updated.connect(self.update_progress)
         self.scraping_worker.finished.connect(self.scraping_finished)
@@ -379,6 +386,11 @@ class MainWindow(QMainWindow):
             self.stop_button.setEnabled(False)
     
     def scraping_finished(self, job_titles):
+        if self.close_pending:
+            # run() はこのシグナルを送った直後に戻るため、すぐに終わる
+            self.scraping_worker.wait()
+            self.close()
+            return
         self.job_titles = job_titles
         self.log("処理が完了しました。")
         
@@ -396,6 +408,8 @@ class MainWindow(QMainWindow):
     
     def handle_error(self, error_message):
         self.log(f"エラー: {error_message}")
+        if self.close_pending:
+            return
         QMessageBox.warning(self, "エラー", error_message)
         
         # UIの更新
@@ -413,13 +427,7 @@ class MainWindow(QMainWindow):
         
         if file_path:
             try:
-                with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-                    fieldnames = ['page', 'title']
-                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                    
-                    writer.writeheader()
-                    for title in self.job_titles:
-                        writer.writerow(title)
+                self.job_titles.save_csv(file_path)
                 
                 self.log(f"結果を {file_path} に保存しました。")
                 QMessageBox.information(self, "成功", f"{len(self.job_titles)}件の求人情報を保存しました。")
@@ -428,9 +436,24 @@ class MainWindow(QMainWindow):
                 self.log(error_message)
                 QMessageBox.warning(self, "エラー", error_message)
 
+    def close_after_stop_timeout(self):
+        if not self.isVisible() or not (self.scraping_worker and self.scraping_worker.isRunning()):
+            return
+        self.log("スレッドが時間内に停止しなかったため、終了します。")
+        self.stop_timed_out = True
+        self.close()
+
     def closeEvent(self, event):
         # アプリケーション終了時にスレッドを停止
         if self.scraping_worker and self.scraping_worker.isRunning():
+            if self.close_pending:
+                # 停止を待っている間の再度の終了操作は、待機上限を過ぎるまで受け付けない
+                if self.stop_timed_out:
+                    event.accept()
+                else:
+                    event.ignore()
+                return
+
             reply = QMessageBox.question(
                 self, '確認', 
                 "スクレイピングが実行中です。終了しますか？",
@@ -438,11 +461,17 @@ class MainWindow(QMainWindow):
             )
             
             if reply == QMessageBox.Yes:
+                # 画面を止めないよう、ここでは待たずにウィンドウを開いたままにし、
+                # スレッドが終わった時点（scraping_finished）で改めて閉じる。
+                # 待機上限を過ぎても終わらなければ、そのまま閉じる
+                self.close_pending = True
                 self.scraping_worker.stop()
-                self.scraping_worker.wait()  # スレッド終了を待機
-            else:
-                event.ignore()
-                return
+                self.start_button.setEnabled(False)
+                self.stop_button.setEnabled(False)
+                self.log("スレッドの停止を待っています。停止後に終了します...")
+                QTimer.singleShot(stop_wait_ms(), self.close_after_stop_timeout)
+            event.ignore()
+            return
         
         event.accept()
 
@@ -451,6 +480,8 @@ def main():
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
+    # ウィンドウの描画が済んでからスクレイピング処理を読み込み始める
+    QTimer.singleShot(0, preload_engine)
     sys.exit(app.exec_())
 
 
@@ -0,0 +1,327 @@
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from jm_fetch import Fetcher, RateLimiter, ResponseCache
+from jm_dedup import TitleDeduplicator
+from jm_frontier import canonicalize, page_url
+from jm_scraping import crawl, log
+
+# 完了したジョブの結果を保持しておく時間（秒）
+JOB_RETENTION = 600.0
+
+
+class CrawlJob:
+    """サービスで受け付けた1件のクロール
+
+    見つかった求人はJSON Linesの1行ずつとして蓄積し、接続中のクライアントへ
+    順に配信する。後から接続したクライアントにも最初の1件から配信される。
+    """
+
+    def __init__(self, key, params):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.params = params
+        self.status = 'queued'
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.lines = []
+        self.subscribers = 0
+        self._condition = threading.Condition()
+
+    def publish(self, record, url):
+        line = json.dumps({'url': url, **record}, ensure_ascii=False)
+        with self._condition:
+            self.lines.append(line)
+            self._condition.notify_all()
+
+    def finish(self, status, error=None):
+        with self._condition:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+            self._condition.notify_all()
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def follow(self, timeout=15.0):
+        """蓄積済みの行を返し、その後は完了するまで新しい行を待って返す
+
+        timeout 秒新しい行がなければ None を返す（接続維持用）。
+        """
+        with self._condition:
+            self.subscribers += 1
+        try:
+            yield from self._follow(timeout)
+        finally:
+            with self._condition:
+                self.subscribers -= 1
+
+    def _follow(self, timeout):
+        index = 0
+        while True:
+            with self._condition:
+                if index >= len(self.lines) and not self.done:
+                    self._condition.wait(timeout)
+                lines = self.lines[index:]
+                done = self.done
+            if lines:
+                index += len(lines)
+                yield from lines
+            elif done:
+                return
+            else:
+                yield None
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'params': self.params,
+            'records': len(self.lines),
+            'subscribers': self.subscribers,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class CrawlService:
+    """クロールのジョブを共有のワーカープールで実行する
+
+    取得処理（セッション・レート制限・キャッシュ）は全ジョブで共有する。
+    実行中のジョブと同じ条件のリクエストは新しいクロールを始めず、
+    そのジョブに合流させる。
+    """
+
+    def __init__(self, fetcher, workers=2):
+        self.fetcher = fetcher
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.jobs = {}
+        self.active = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_params(body):
+        if not isinstance(body, dict):
+            raise ValueError("リクエストの本文はJSONオブジェクトで指定してください。")
+        if body.get('urls') is not None:
+            urls = body['urls']
+            # 文字列をそのまま受け付けると1文字ずつのURLとして扱われてしまう
+            if not isinstance(urls, list):
+                raise ValueError("urls はURLの配列で指定してください。")
+        else:
+            urls = [body['url']] if body.get('url') else []
+        if not urls or not all(isinstance(url, str) and url for url in urls):
+            raise ValueError("url または urls を指定してください。")
+        max_pages = int(body.get('max_pages', 50))
+        if max_pages <= 0:
+            raise ValueError("max_pages は1以上の整数を指定してください。")
+        # パラメータの順序などの表記が違っても同じ検索結果なら同じジョブに合流させる
+        return {
+            'urls': sorted({page_url(*canonicalize(url)) for url in urls}),
+            'max_pages': max_pages,
+            'dedup': bool(body.get('dedup', False)),
+            'near_dup': bool(body.get('near_dup', False)),
+            'pipeline': bool(body.get('pipeline', False)),
+        }
+
+    def submit(self, body):
+        """ジョブを登録して (ジョブ, 合流したかどうか) を返す"""
+        params = self.normalize_params(body)
+        key = json.dumps(params, sort_keys=True)
+        with self._lock:
+            self._expire_jobs()
+            job = self.active.get(key)
+            if job is not None:
+                return job, True
+            job = CrawlJob(key, params)
+            self.jobs[job.id] = job
+            self.active[key] = job
+        self.executor.submit(self._run, job)
+        log(f"ジョブ {job.id} を受け付けました: {', '.join(params['urls'])}")
+        return job, False
+
+    def _run(self, job):
+        job.status = 'running'
+        params = job.params
+        dedup = None
+        if params['dedup'] or params['near_dup']:
+            dedup = TitleDeduplicator(near_duplicates=params['near_dup'])
+        try:
+            crawl(params['urls'], params['max_pages'], self.fetcher, on_record=job.publish,
+                  pipelined=params['pipeline'], dedup=dedup)
+            job.finish('done')
+        except Exception as e:
+            log(f"ジョブ {job.id} でエラーが発生しました: {str(e)}")
+            job.finish('error', str(e))
+        finally:
+            with self._lock:
+                if self.active.get(job.key) is job:
+                    del self.active[job.key]
+        log(f"ジョブ {job.id} が完了しました: {len(job.lines)} 件")
+
+    def _expire_jobs(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.done and now - job.finished_at > JOB_RETENTION:
+                del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._lock:
+            return [job.summary() for job in self.jobs.values()]
+
+    def shutdown(self):
+        self.fetcher.cancel()
+        self.executor.shutdown(wait=True)
+        self.fetcher.close()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """ジョブサービスのHTTPハンドラ
+
+    POST /jobs               ジョブを登録し、ジョブの情報を返す
+    POST /crawl              ジョブを登録し、そのまま結果を配信する
+    GET  /jobs               ジョブの一覧
+    GET  /jobs/<id>          ジョブの状態
+    GET  /jobs/<id>/stream   結果の配信（?format=sse でServer-Sent Events）
+    """
+
+    protocol_version = 'HTTP/1.1'
+    service = None
+
+    def log_message(self, format, *args):
+        log(f"{self.address_string()} - {format % args}")
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        if length == 0:
+            return {}
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def stream(self, job, sse=False):
+        """ジョブの結果をチャンク形式で配信する"""
+        self.send_response(200)
+        if sse:
+            self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+            self.send_header('Cache-Control', 'no-cache')
+        else:
+            self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('X-Job-Id', job.id)
+        self.end_headers()
+
+        try:
+            for line in job.follow():
+                if line is None:
+                    # 新しい結果がない間も接続が切れないように空行（SSEではコメント）を送る
+                    self.write_chunk(b": keep-alive\n\n" if sse else b"\n")
+                elif sse:
+                    self.write_chunk(f"data: {line}\n\n".encode('utf-8'))
+                else:
+                    self.write_chunk((line + "\n").encode('utf-8'))
+            if sse:
+                end = json.dumps({'status': job.status, 'error': job.error}, ensure_ascii=False)
+                self.write_chunk(f"event: end\ndata: {end}\n\n".encode('utf-8'))
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # クライアントが切断した場合もジョブは続行する
+            self.close_connection = True
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        segments = [segment for segment in parts.path.split('/') if segment]
+        query = parse_qs(parts.query)
+
+        if segments == ['jobs']:
+            self.send_json(200, {'jobs': self.service.list_jobs()})
+            return
+        if len(segments) in (2, 3) and segments[0] == 'jobs':
+            job = self.service.get(segments[1])
+            if job is None:
+                self.send_json(404, {'error': "ジョブが見つかりません。"})
+            elif len(segments) == 2:
+                self.send_json(200, job.summary())
+            elif segments[2] == 'stream':
+                self.stream(job, sse=query.get('format') == ['sse'])
+            else:
+                self.send_json(404, {'error': "不明なパスです。"})
+            return
+        self.send_json(404, {'error': "不明なパスです。"})
+
+    def do_POST(self):
+        path = urlsplit(self.path).path.rstrip('/')
+        if path not in ('/jobs', '/crawl'):
+            self.send_json(404, {'error': "不明なパスです。"})
+            return
+        try:
+            job, merged = self.service.submit(self.read_json())
+        except (ValueError, TypeError) as e:
+            self.send_json(400, {'error': str(e)})
+            return
+
+        if path == '/jobs':
+            self.send_json(200 if merged else 202, {**job.summary(), 'merged': merged})
+        else:
+            self.stream(job, sse='text/event-stream' in self.headers.get('Accept', ''))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="クロールのジョブをHTTPで受け付けるローカルサービス")
+    parser.add_argument('--host', default='127.0.0.1', help="待ち受けるアドレス（デフォルト: 127.0.0.1）")
+    parser.add_argument('--port', type=int, default=8765, help="待ち受けるポート（デフォルト: 8765）")
+    parser.add_argument('--workers', type=int, default=2, help="同時に実行するジョブ数（デフォルト: 2）")
+    parser.add_argument('--rate', type=float, default=None, help="全ジョブ共通のリクエスト数の上限（件/秒）")
+    parser.add_argument('--cache-dir', default=None, help="取得したページをキャッシュするディレクトリ")
+    parser.add_argument('--cache-ttl', type=float, default=None, help="キャッシュの有効期間（秒）")
+    args = parser.parse_args(argv)
+
+    fetcher = Fetcher(
+        rate_limiter=RateLimiter(args.rate) if args.rate else None,
+        cache=ResponseCache(args.cache_dir, args.cache_ttl) if args.cache_dir else None,
+    )
+    service = CrawlService(fetcher, workers=args.workers)
+    ServiceHandler.service = service
+    server = ThreadingHTTPServer((args.host, args.port), ServiceHandler)
+    server.daemon_threads = True
+
+    log(f"http://{args.host}:{args.port}/ でジョブを受け付けています...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log("サービスを終了します。実行中のジョブを停止しています...")
+        server.server_close()
+        service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
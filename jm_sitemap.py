@@ -0,0 +1,263 @@
+import os
+import re
+import sys
+import json
+import zlib
+import argparse
+import requests
+from datetime import datetime, timezone
+from xml.etree.ElementTree import XMLPullParser, ParseError
+
+from jm_fetch import Fetcher, FetchCancelled
+from jm_frontier import canonicalize
+from jm_queue import WorkQueue
+from jm_scraping import log
+
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+DEFAULT_SITEMAP_URL = 'https://job-medley.com/sitemap.xml'
+
+# ローカルファイルを読み込む単位
+READ_SIZE = 64 * 1024
+
+# サイトマップ1つの取得にかける時間の上限（秒）。求人ページより大きいため長めにする
+SITEMAP_TIMEOUT = 300.0
+
+
+def parse_lastmod(value):
+    """W3C Datetime 形式の lastmod を timezone 付きの datetime に変換する"""
+    if not value:
+        return None
+    value = value.strip().replace('Z', '+00:00')
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _gunzip(chunks):
+    """gzip 圧縮されていれば展開しながら、そうでなければそのまま返す"""
+    decompressor = None
+    for chunk in chunks:
+        if decompressor is None:
+            if chunk[:2] == b'\x1f\x8b':
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                decompressor = False
+        if decompressor:
+            yield decompressor.decompress(chunk)
+        else:
+            yield chunk
+    if decompressor:
+        yield decompressor.flush()
+
+
+def _is_url(source):
+    return source.startswith(('http://', 'https://'))
+
+
+def _local_path(source):
+    return source[len('file://'):] if source.startswith('file://') else source
+
+
+def resolve_loc(parent, loc):
+    """子サイトマップの loc を解決する
+
+    ローカルのサイトマップインデックス（ミラーやテスト用のファイル）に書かれた
+    相対パスは、インデックスのファイルからの相対パスとして扱う。
+    """
+    if _is_url(parent) or _is_url(loc) or loc.startswith('file://') or os.path.isabs(loc):
+        return loc
+    return os.path.join(os.path.dirname(_local_path(parent)), loc)
+
+
+def open_chunks(source, fetcher=None):
+    """URLならフェッチャーで、ローカルのパス（または file://）ならファイルから順に読み込む"""
+    if _is_url(source):
+        if fetcher is None:
+            raise ValueError("URLのサイトマップを読み込むには fetcher が必要です。")
+        chunks = fetcher.stream(source)
+    else:
+        path = _local_path(source)
+
+        def read_file():
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(READ_SIZE)
+                    if not chunk:
+                        return
+                    yield chunk
+        chunks = read_file()
+    return _gunzip(chunks)
+
+
+def iter_sitemap(chunks):
+    """サイトマップのXMLを逐次解析し、(種類, loc, lastmod) を順に返す
+
+    種類はサイトマップインデックスの子なら 'sitemap'、URLセットの項目なら 'url'。
+    処理済みの要素はすぐに破棄するため、ファイルの大きさによらず
+    使用メモリはほぼ一定になる。
+    """
+    parser = XMLPullParser(events=('start', 'end'))
+    root = None
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if event == 'start':
+                if root is None:
+                    root = element
+                continue
+            tag = element.tag.replace(SITEMAP_NS, '')
+            if tag in ('url', 'sitemap'):
+                loc = element.findtext(f'{SITEMAP_NS}loc') or element.findtext('loc')
+                lastmod = element.findtext(f'{SITEMAP_NS}lastmod') or element.findtext('lastmod')
+                if loc:
+                    yield tag, loc.strip(), parse_lastmod(lastmod)
+                # 処理済みの要素を親から取り除く
+                root.clear()
+    parser.close()
+
+
+class SitemapFilter:
+    """サイトマップの項目を職種・URLのパターン・更新日時で絞り込む
+
+    patterns は求人ページのURLに、sitemap_patterns はインデックスに並ぶ
+    子サイトマップのURLに対する正規表現で、子サイトマップは sitemap_patterns に
+    一致したものだけを読み込む。
+    """
+
+    def __init__(self, category=None, patterns=(), since=None, sitemap_patterns=()):
+        self.category_re = re.compile(rf'^https?://[^/]+/{re.escape(category)}/') if category else None
+        self.patterns = [re.compile(pattern) for pattern in patterns]
+        self.sitemap_patterns = [re.compile(pattern) for pattern in sitemap_patterns]
+        self.since = since
+
+    def changed(self, lastmod):
+        # lastmod のない項目は変更の有無が分からないため対象に含める
+        return self.since is None or lastmod is None or lastmod > self.since
+
+    def follows(self, loc, lastmod):
+        if self.sitemap_patterns and not any(pattern.search(loc) for pattern in self.sitemap_patterns):
+            return False
+        return self.changed(lastmod)
+
+    def matches(self, loc, lastmod):
+        if self.category_re and not self.category_re.search(loc):
+            return False
+        if self.patterns and not any(pattern.search(loc) for pattern in self.patterns):
+            return False
+        return self.changed(lastmod)
+
+
+def discover(source, fetcher=None, sitemap_filter=None, failed=None):
+    """サイトマップ（インデックス）をたどり、条件に合う求人ページを (loc, lastmod) で順に返す
+
+    インデックスの子サイトマップのうち、sitemap_patterns に一致しないものと
+    lastmod が前回の実行より古いものは読み込まない。
+    子サイトマップの取得や解析に失敗した場合はログに残して次へ進み、
+    failed にリストを渡していればそのURLを追加する。
+    """
+    sitemap_filter = sitemap_filter or SitemapFilter()
+    pending = [source]
+    while pending:
+        current = pending.pop(0)
+        log(f"サイトマップを読み込み中... {current}")
+        try:
+            for kind, loc, lastmod in iter_sitemap(open_chunks(current, fetcher)):
+                if kind == 'sitemap':
+                    loc = resolve_loc(current, loc)
+                    if sitemap_filter.follows(loc, lastmod):
+                        pending.append(loc)
+                elif sitemap_filter.matches(loc, lastmod):
+                    yield loc, lastmod
+        except FetchCancelled:
+            raise
+        except (OSError, ParseError, requests.RequestException) as e:
+            if current == source:
+                raise
+            log(f"サイトマップの読み込みに失敗しました: {current} ({str(e)})")
+            if failed is not None:
+                failed.append(current)
+
+
+class DiscoveryState:
+    """前回の探索日時を記録し、次回はそれ以降に更新された項目だけを対象にする"""
+
+    def __init__(self, path):
+        self.path = path
+        self.last_run = None
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.last_run = parse_lastmod(json.load(f).get('last_run'))
+
+    def save(self, started_at):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'last_run': started_at.isoformat()}, f)
+        os.replace(tmp_path, self.path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="サイトマップから求人ページを列挙します。")
+    parser.add_argument('source', nargs='?', default=DEFAULT_SITEMAP_URL,
+                        help="サイトマップ（インデックス）のURLまたはローカルファイル")
+    parser.add_argument('--category', default=None, help="職種コード（URLの最初のパス、例: ans）")
+    parser.add_argument('--pattern', action='append', default=[],
+                        help="求人ページのURLが一致すべき正規表現（複数指定可）")
+    parser.add_argument('--sitemap-pattern', action='append', default=[],
+                        help="読み込む子サイトマップのURLが一致すべき正規表現（複数指定可）")
+    parser.add_argument('--state', default=None,
+                        help="前回の探索日時を記録するファイル。指定すると前回以降に更新された項目だけを出力する")
+    parser.add_argument('--queue', metavar='DB', default=None,
+                        help="見つかった求人ページを詳細ページのタスクとして登録する分散クロールのキュー（SQLiteファイル）")
+    parser.add_argument('-o', '--output', default='-', help="出力先（デフォルト: 標準出力）")
+    args = parser.parse_args(argv)
+
+    state = DiscoveryState(args.state) if args.state else None
+    started_at = datetime.now(timezone.utc)
+    sitemap_filter = SitemapFilter(args.category, args.pattern, state.last_run if state else None,
+                                   args.sitemap_pattern)
+    fetcher = Fetcher(total_timeout=SITEMAP_TIMEOUT)
+    queue = WorkQueue(args.queue) if args.queue else None
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    count = 0
+    enqueued = 0
+    failed = []
+    try:
+        for loc, lastmod in discover(args.source, fetcher, sitemap_filter, failed):
+            record = {'url': loc, 'lastmod': lastmod.isoformat() if lastmod else None}
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            count += 1
+            # jm_scraping.py --queue のワーカーが詳細ページから求人タイトルを取り出す。
+            # 取得済みでも、それより後に更新されたページは取得し直す
+            if queue is not None and queue.enqueue(canonicalize(loc)[0], kind='detail', restart=True,
+                                                   modified_at=lastmod.timestamp() if lastmod else None):
+                enqueued += 1
+    except (OSError, ParseError, requests.RequestException) as e:
+        log(f"サイトマップを読み込めませんでした: {args.source} ({str(e)})")
+        return 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        fetcher.close()
+        if queue is not None:
+            queue.close()
+
+    log(f"{count} 件の求人ページが見つかりました。")
+    if queue is not None:
+        log(f"{enqueued} 件をキュー {args.queue} に登録しました。")
+    if failed:
+        # 読み込めなかったサイトマップの変更を次回も拾えるよう、前回の探索日時は更新しない
+        log(f"{len(failed)} 件のサイトマップを読み込めなかったため、探索日時は更新しません。")
+        return 1
+    if state:
+        state.save(started_at)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from jm_preload import ENGINE_MODULES
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+GUI_MODULES = {'tk': 'jm_scraping_gui', 'qt': 'jm_scraping_qt'}
+
+# 起動直後に表示されるウィンドウで、すぐに1ページ分のスクレイピングを開始する子プロセス
+CHILD_CODE = r"""
+import sys, json, time
+
+def mark(event):
+    print(json.dumps({'event': event, 'time': time.time()}), flush=True)
+
+gui, url = sys.argv[1], sys.argv[2]
+if gui == 'tk':
+    import tkinter as tk
+    import jm_scraping_gui as module
+    mark('import')
+    root = tk.Tk()
+    app = module.ScraperGUI(root)
+    root.update()
+    mark('window')
+    root.after_idle(module.preload_engine)
+    app.scraper.min_delay = app.scraper.max_delay = 0
+    app.url_var.set(url)
+    app.max_pages_var.set('1')
+    app.start_scraping()
+    root.mainloop()
+else:
+    import jm_scraping_qt as module
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import QTimer
+    mark('import')
+    app = QApplication(sys.argv)
+    window = module.MainWindow()
+    window.show()
+    app.processEvents()
+    mark('window')
+    QTimer.singleShot(0, module.preload_engine)
+    worker = module.ScrapingWorker(url, 1)
+    worker.min_delay = worker.max_delay = 0
+    worker.start()
+    app.exec_()
+"""
+
+PAGE_HTML = "<html><body><h3>ベンチマーク用の求人</h3></body></html>".encode('utf-8')
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+class FirstRequestServer(ThreadingHTTPServer):
+    """最初のリクエストを受け付けた時刻を記録するローカルのHTTPサーバー"""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FirstRequestHandler)
+        self.first_request = threading.Event()
+        self.first_request_time = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/search/?prefecture_id=13"
+
+
+class FirstRequestHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if not self.server.first_request.is_set():
+            self.server.first_request_time = time.time()
+            self.server.first_request.set()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(PAGE_HTML)))
+        self.end_headers()
+        self.wfile.write(PAGE_HTML)
+
+
+def measure_startup(gui, timeout=60.0):
+    """GUIを1回起動し、起動からの経過時間（秒）を返す
+
+    import: GUIのモジュールの読み込み完了、window: ウィンドウの表示、
+    first_fetch: 表示直後に開始したスクレイピングの最初のリクエストがサーバーに届くまで。
+    """
+    server = FirstRequestServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    start = time.time()
+    child = subprocess.Popen([sys.executable, '-c', CHILD_CODE, gui, server.url],
+                             cwd=BASE_DIR, stdout=subprocess.PIPE, text=True)
+    events = {}
+    try:
+        for line in child.stdout:
+            event = json.loads(line)
+            events[event['event']] = event['time'] - start
+            if event['event'] == 'window':
+                break
+        if 'window' not in events:
+            child.wait()
+            raise RuntimeError(f"ウィンドウが表示されませんでした（終了コード {child.returncode}）。")
+        deadline = time.monotonic() + timeout
+        while not server.first_request.wait(0.05):
+            if child.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("スクレイピングのリクエストが届きませんでした。")
+        events['first_fetch'] = server.first_request_time - start
+    finally:
+        child.kill()
+        child.wait()
+        server.shutdown()
+        server.server_close()
+    return events
+
+
+def measure_importtime(module):
+    """python -X importtime で module を読み込み、モジュールごとの時間（マイクロ秒）を返す
+
+    (全体の累計, [(自身の時間, 累計, モジュール名), ...]) を返す。
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=BASE_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append((int(self_us), int(cumulative_us), name.strip()))
+    total = next((cumulative for _, cumulative, name in entries if name == module), 0)
+    return total, entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GUI版の起動時間（ウィンドウ表示・最初の取得まで）を計測します。")
+    parser.add_argument('--gui', choices=sorted(GUI_MODULES), default='tk', help="計測するGUI（デフォルト: tk）")
+    parser.add_argument('-n', '--runs', type=int, default=5, help="起動を繰り返す回数（デフォルト: 5）")
+    parser.add_argument('--top', type=int, default=10, help="表示する読み込みの遅いモジュールの数")
+    parser.add_argument('--save', metavar='FILE', default=None, help="結果をJSONで保存する（基準値として使う）")
+    parser.add_argument('--baseline', metavar='FILE', default=None,
+                        help="基準値のJSON。いずれかの値が許容範囲を超えて遅くなった場合は終了コード1を返す")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="基準値から許容する遅れの割合（デフォルト: 0.2）")
+    args = parser.parse_args(argv)
+
+    module = GUI_MODULES[args.gui]
+    import_total, entries = measure_importtime(module)
+    print(f"{module} の読み込み（-X importtime）: {import_total / 1000:.1f} ミリ秒")
+    print("読み込みの遅いモジュール（自身の時間）:")
+    for self_us, cumulative_us, name in sorted(entries, reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ミリ秒（累計 {cumulative_us / 1000:8.1f}）  {name}")
+    eager = [name for _, _, name in entries if name.split('.')[0] in ENGINE_MODULES + ('requests',)]
+    if eager:
+        print(f"起動時に読み込まれているスクレイピング処理のモジュール: {', '.join(sorted(set(eager)))}")
+
+    runs = []
+    for index in range(args.runs):
+        events = measure_startup(args.gui)
+        log(f"  {index + 1} 回目: ウィンドウ表示 {events['window']:.3f} 秒、最初の取得 {events['first_fetch']:.3f} 秒")
+        runs.append(events)
+
+    result = {
+        'gui': args.gui,
+        'import': import_total / 1e6,
+        'window': statistics.median(run['window'] for run in runs),
+        'first_fetch': statistics.median(run['first_fetch'] for run in runs),
+    }
+    print(f"ウィンドウ表示まで（中央値）: {result['window']:.3f} 秒")
+    print(f"最初の取得まで（中央値）: {result['first_fetch']:.3f} 秒")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressed = False
+        for key in ('import', 'window', 'first_fetch'):
+            limit = baseline[key] * (1 + args.tolerance)
+            if result[key] > limit:
+                print(f"基準値より遅くなっています: {key} {result[key]:.3f} 秒（基準値 {baseline[key]:.3f} 秒）")
+                regressed = True
+        if regressed:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
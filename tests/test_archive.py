@@ -0,0 +1,38 @@
+import requests
+
+from jm_archive import HtmlArchive, read_entry, read_index
+from jm_fetch import Fetcher, ResponseCache
+from jm_scraping import _replay_entry
+
+
+def make_response(html):
+    response = requests.Response()
+    response.status_code = 200
+    response.encoding = 'utf-8'
+    response._content = html.encode('utf-8')
+    return response
+
+
+def test_detail_pages_are_replayed_as_single_listing(tmp_path):
+    archive = HtmlArchive(str(tmp_path), codec='gzip')
+    archive.put('https://job-medley.com/ans/100001/',
+                make_response("<html><h1>さくらクリニック 看護師の求人</h1></html>"), 'detail')
+
+    entry, = read_index(str(tmp_path))
+    assert entry['kind'] == 'detail'
+    url, records = _replay_entry((str(tmp_path), entry))
+    assert records == [{'page': 1, 'title': 'さくらクリニック 看護師の求人'}]
+
+
+def test_cached_pages_are_archived(tmp_path):
+    url = 'https://job-medley.com/ans/search/'
+    cache = ResponseCache(str(tmp_path / 'cache'))
+    cache.put(url, make_response("<html><h3>さくらクリニック</h3></html>"))
+    archive_dir = str(tmp_path / 'archive')
+    fetcher = Fetcher(cache=cache, archive=HtmlArchive(archive_dir, codec='gzip'))
+
+    assert fetcher.fetch(url).status_code == 200
+    entry, = read_index(archive_dir)
+    assert entry['url'] == url
+    assert read_entry(archive_dir, entry) == "<html><h3>さくらクリニック</h3></html>"
+    fetcher.close()
@@ -0,0 +1,71 @@
+import itertools
+
+from jm_dedup import MinHashIndex, TitleDeduplicator, normalize_title
+
+# 法人名の定型部分を共有するが、いずれも別の職場を指すタイトル
+CORPORATIONS = ['山田', '佐藤', '鈴木', '高橋', '田中', '伊藤', '渡辺', '中村', '小林', '加藤',
+                '吉田', '山本', '松本', '井上', '木村', '林', '清水', '山口', '森', '池田']
+NAMES = ['さくら', 'ひまわり', 'あおば', 'みどり', 'つばさ', 'ひかり', 'すずらん', 'わかば', 'こころ', 'やまびこ']
+KINDS = ['クリニック', '病院', '歯科医院', '訪問看護ステーション', 'デイケアセンター',
+         '内科', '整形外科', '眼科', '皮膚科', '小児科']
+
+
+def distinct_titles():
+    return [f"医療法人社団{corporation}会 {name}{kind}"
+            for corporation, name, kind in itertools.product(CORPORATIONS, NAMES, KINDS)]
+
+
+def test_normalize_title_ignores_width_spaces_and_brackets():
+    assert normalize_title("【ＡＢＣ】 クリニック") == normalize_title("[abc]クリニック")
+
+
+def test_exact_duplicates_are_detected():
+    dedup = TitleDeduplicator()
+    assert not dedup.is_duplicate("さくらクリニック")
+    assert dedup.is_duplicate("さくら　クリニック")
+    assert dedup.duplicate_count == 1
+    assert len(dedup) == 1
+
+
+def test_titles_sharing_boilerplate_are_not_near_duplicates():
+    index = MinHashIndex()
+    dropped = [title for title in distinct_titles() if not index.add_if_new(normalize_title(title))]
+    assert dropped == []
+
+
+def test_near_duplicates_are_detected():
+    dedup = TitleDeduplicator(near_duplicates=True)
+    assert not dedup.is_duplicate("医療法人社団山田会 さくらクリニック 看護師の求人（東京都世田谷区）")
+    assert dedup.is_duplicate("医療法人社団山田会 さくらクリニック 看護師の求人（東京都世田谷区)!")
+    assert not dedup.is_duplicate("医療法人社団山田会 ひまわり歯科医院 歯科衛生士の求人（神奈川県横浜市）")
+    assert dedup.duplicate_count == 1
+
+
+def boilerplate_titles(count):
+    wards = ['千代田', '中央', '港', '新宿', '文京', '台東', '墨田', '江東', '品川', '目黒',
+             '大田', '世田谷', '渋谷', '中野', '杉並', '豊島', '北', '荒川', '板橋', '練馬']
+    titles = (f"医療法人社団{corporation}{suffix}会 {name}クリニック 看護師の求人（東京都{ward}区）"
+              for suffix, corporation, name, ward in itertools.product(CORPORATIONS, CORPORATIONS, NAMES, wards))
+    return [normalize_title(title) for title in itertools.islice(titles, count)]
+
+
+def test_comparisons_per_title_are_bounded_on_boilerplate_titles():
+    # 定型の語句を共有するタイトルが同じ帯に集まっても、1件あたりの比較回数は件数によらず
+    # 帯の数 × バケットの上限を超えず、同じ候補を2回比べることもない
+    index = MinHashIndex(max_bucket_size=16)
+    similarity = index._similarity
+    compared = []
+
+    def counting_similarity(shingle_hashes, stored):
+        compared.append(stored)
+        return similarity(shingle_hashes, stored)
+
+    index._similarity = counting_similarity
+    most = 0
+    for title in boilerplate_titles(4000):
+        compared.clear()
+        index.add_if_new(title)
+        assert len(compared) == len(set(compared))
+        most = max(most, len(compared))
+    assert most <= index.bands * index.max_bucket_size
+    assert max(1 if isinstance(bucket, int) else len(bucket) for bucket in index._buckets.values()) <= 16
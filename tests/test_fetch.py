@@ -0,0 +1,105 @@
+import socket
+import threading
+import time
+
+import pytest
+import requests
+
+from jm_fetch import FetchCancelled, Fetcher
+
+
+def serve(handler):
+    """1接続ずつ handler(conn) で応答するローカルサーバーを起動し、URLを返す"""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+
+    def accept():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+    def handle(conn):
+        with conn:
+            conn.recv(65536)
+            try:
+                handler(conn)
+            except OSError:
+                pass
+
+    threading.Thread(target=accept, daemon=True).start()
+    return f"http://127.0.0.1:{server.getsockname()[1]}/", server
+
+
+def slow_headers(conn):
+    # ステータス行の後、ヘッダーを1行ずつ送り続けて終わらない
+    conn.sendall(b"HTTP/1.1 200 OK\r\n")
+    for i in range(100):
+        time.sleep(0.2)
+        conn.sendall(f"X-Slow-{i}: 1\r\n".encode())
+
+
+def slow_body(conn):
+    conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n")
+    for _ in range(100):
+        time.sleep(0.2)
+        conn.sendall(b"x")
+
+
+def complete(conn):
+    body = b"<html>ok</html>"
+    conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+
+
+@pytest.fixture
+def fetcher():
+    fetcher = Fetcher(total_timeout=1.0, min_delay=0, max_delay=0)
+    yield fetcher
+    fetcher.close()
+
+
+@pytest.mark.parametrize('handler', [slow_headers, slow_body])
+def test_total_timeout_applies_while_receiving(fetcher, handler):
+    url, server = serve(handler)
+    started = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        fetcher.get(url)
+    assert time.monotonic() - started < 2.0
+    server.close()
+
+
+@pytest.mark.parametrize('handler', [slow_headers, slow_body])
+def test_cancel_interrupts_receiving(handler):
+    fetcher = Fetcher(min_delay=0, max_delay=0)
+    url, server = serve(handler)
+    errors = []
+
+    def get():
+        try:
+            fetcher.get(url)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=get)
+    thread.start()
+    time.sleep(0.5)
+    started = time.monotonic()
+    fetcher.cancel()
+    assert time.monotonic() - started < 0.1
+    thread.join(1.0)
+    assert not thread.is_alive()
+    assert isinstance(errors[0], FetchCancelled)
+    fetcher.close()
+    server.close()
+
+
+def test_connection_is_reused_after_completed_request(fetcher):
+    url, server = serve(complete)
+    assert fetcher.get(url).text == "<html>ok</html>"
+    # 終わったリクエストの時間の上限が過ぎても、次のリクエストは切断されない
+    time.sleep(1.2)
+    assert fetcher.get(url).text == "<html>ok</html>"
+    server.close()
@@ -0,0 +1,55 @@
+import time
+
+from jm_frontier import Frontier, canonicalize, page_number, page_url
+
+
+def test_canonicalize_ignores_notation_differences():
+    url, page = canonicalize("HTTPS://Job-Medley.com:443/ans/search/?b=2&a=%E6%9D%B1&page=3#top")
+    assert (url, page) == ("https://job-medley.com/ans/search/?a=%E6%9D%B1&b=2", 3)
+    assert canonicalize("https://job-medley.com/ans/search/?a=東&b=2")[0] == url
+
+
+def test_page_url_and_page_number():
+    url = "https://job-medley.com/ans/search/?page=2&a=1"
+    assert page_url(url, 1) == "https://job-medley.com/ans/search/?a=1"
+    assert page_url(url, 5) == "https://job-medley.com/ans/search/?a=1&page=5"
+    assert page_number(url) == 2
+    assert page_number("https://job-medley.com/ans/search/") == 1
+
+
+def test_page_number_treats_invalid_values_as_first_page():
+    # '²' は str.isdigit() では数字とみなされるが int() では変換できない
+    for value in ['%C2%B2', '%EF%BC%93', '0', '-1', 'abc', '']:
+        assert page_number(f"https://job-medley.com/ans/search/?page={value}") == 1
+
+
+def test_memory_frontier_evicts_least_recently_seen():
+    frontier = Frontier(max_entries=2)
+    assert frontier.add("https://example.com/a/")
+    assert frontier.add("https://example.com/b/")
+    assert not frontier.add("https://example.com/a/?page=1")
+    assert frontier.add("https://example.com/c/")
+    assert len(frontier) == 2
+    # 最も古く参照された b が忘れられ、a は残っている
+    assert not frontier.add("https://example.com/a/")
+    assert frontier.add("https://example.com/b/")
+
+
+def test_discard_allows_page_to_be_added_again(tmp_path):
+    for frontier in [Frontier(), Frontier(str(tmp_path / 'frontier.db'))]:
+        assert frontier.add("https://example.com/a/?page=2")
+        frontier.discard("https://example.com/a/?page=2#top")
+        assert frontier.add("https://example.com/a/?page=2")
+        frontier.close()
+
+
+def test_file_frontier_adds_pages_again_after_max_age(tmp_path):
+    frontier = Frontier(str(tmp_path / 'frontier.db'), max_age=3600)
+    assert frontier.add("https://example.com/a/")
+    assert not frontier.add("https://example.com/a/")
+
+    frontier._connect().execute("UPDATE seen SET seen_at = ?", (time.time() - 7200,))
+    assert frontier.add("https://example.com/a/")
+    assert not frontier.add("https://example.com/a/")
+    assert len(frontier) == 1
+    frontier.close()
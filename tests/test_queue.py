@@ -0,0 +1,74 @@
+import pytest
+
+from jm_queue import MAX_ATTEMPTS, WorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'crawl.db'))
+    yield queue
+    queue.close()
+
+
+def test_claim_leases_each_task_once(queue):
+    assert queue.enqueue('https://example.com/search/', 1, 3)
+    assert not queue.enqueue('https://example.com/search/', 1, 3)
+
+    task = queue.claim('worker-1')
+    assert (task.kind, task.url, task.page, task.attempts) == ('page', 'https://example.com/search/', 1, 1)
+    assert queue.claim('worker-2') is None
+
+    assert queue.complete(task, [{'page': 1, 'title': 'さくらクリニック'}], [(task.url, 2, 3)])
+    assert queue.claim('worker-2').page == 2
+    assert list(queue.iter_results()) == [('https://example.com/search/', {'page': 1, 'title': 'さくらクリニック'})]
+
+
+def test_expired_lease_is_claimed_again_and_old_lease_is_lost(queue):
+    queue.enqueue('https://example.com/search/')
+    lost = queue.claim('worker-1', lease_seconds=-1)
+
+    task = queue.claim('worker-2')
+    assert task.id == lost.id
+    assert task.attempts == 2
+    assert not queue.heartbeat(lost)
+    assert not queue.complete(lost, [{'page': 1, 'title': '古い結果'}])
+    assert queue.complete(task, [])
+    assert list(queue.iter_results()) == []
+
+
+def test_expired_lease_fails_after_max_attempts(queue):
+    queue.enqueue('https://example.com/search/')
+    for _ in range(MAX_ATTEMPTS):
+        queue.claim('worker-1', lease_seconds=-1)
+
+    assert queue.claim('worker-1') is None
+    assert queue.counts() == {'failed': 1}
+    assert queue.is_drained()
+
+
+def test_release_does_not_count_as_attempt(queue):
+    queue.enqueue('https://example.com/search/')
+    task = queue.claim('worker-1')
+    queue.release(task)
+    assert queue.claim('worker-2').attempts == 1
+
+
+def test_restart_replaces_results_of_previous_run(queue):
+    url = 'https://example.com/search/'
+    queue.enqueue(url, 1, 2)
+    task = queue.claim('worker-1')
+    queue.complete(task, [{'page': 1, 'title': '前回の求人'}], [(url, 2, 2)])
+    queue.complete(queue.claim('worker-1'), [{'page': 2, 'title': '前回の2ページ目'}])
+
+    assert not queue.enqueue(url, 1, 2)
+    assert queue.enqueue(url, 1, 2, restart=True)
+    assert queue.counts() == {'pending': 1}
+    assert list(queue.iter_results()) == []
+
+
+def test_restart_keeps_tasks_in_progress(queue):
+    url = 'https://example.com/search/'
+    queue.enqueue(url, 1, 2)
+    task = queue.claim('worker-1')
+    assert not queue.enqueue(url, 1, 2, restart=True)
+    assert queue.complete(task, [])
@@ -0,0 +1,29 @@
+import io
+
+from jm_records import RecordStore
+
+
+def make_store():
+    return RecordStore([{'page': 1, 'title': 'a'}, {'page': 1, 'title': 'b'}, {'page': 2, 'title': 'c'}])
+
+
+def test_page_counts_follow_appends():
+    store = make_store()
+    assert len(store) == 3
+    assert store.sorted_page_counts() == [(1, 2), (2, 1)]
+
+
+def test_index_and_slice():
+    store = make_store()
+    assert store[-1] == {'page': 2, 'title': 'c'}
+    sliced = store[1:]
+    assert isinstance(sliced, RecordStore)
+    assert list(sliced) == [{'page': 1, 'title': 'b'}, {'page': 2, 'title': 'c'}]
+    assert sliced.sorted_page_counts() == [(1, 1), (2, 1)]
+    assert list(store[::-2]) == [{'page': 2, 'title': 'c'}, {'page': 1, 'title': 'a'}]
+
+
+def test_write_csv():
+    output = io.StringIO()
+    make_store().write_csv(output)
+    assert output.getvalue().splitlines() == ['page,title', '1,a', '1,b', '2,c']
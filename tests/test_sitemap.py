@@ -0,0 +1,102 @@
+import os
+import json
+import shutil
+from datetime import datetime, timezone
+
+from jm_queue import WorkQueue
+from jm_sitemap import SitemapFilter, discover, main, open_chunks, iter_sitemap
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'sitemap')
+INDEX = os.path.join(FIXTURES, 'index.xml')
+BROKEN_INDEX = os.path.join(FIXTURES, 'index-broken.xml')
+
+
+def listing_ids(entries):
+    return sorted(loc.rstrip('/').rsplit('/', 1)[1] for loc, _ in entries)
+
+
+def test_iter_sitemap_reads_gzip_urlset():
+    entries = list(iter_sitemap(open_chunks(os.path.join(FIXTURES, 'jobs-2.xml.gz'))))
+    assert [kind for kind, _, _ in entries] == ['url', 'url']
+    assert entries[0][1] == 'https://job-medley.com/ans/100004/'
+    assert entries[0][2] == datetime(2026, 5, 31, 1, 0, tzinfo=timezone.utc)
+
+
+def test_discover_follows_index_children():
+    entries = list(discover(INDEX))
+    assert listing_ids(entries) == ['100001', '100002', '100003', '100004', '200001', '200002']
+
+
+def test_discover_filters_by_category_and_pattern():
+    entries = list(discover(INDEX, sitemap_filter=SitemapFilter('ans', [r'/10000[12]/'])))
+    assert listing_ids(entries) == ['100001', '100002']
+
+
+def test_discover_reads_only_children_matching_sitemap_pattern():
+    entries = list(discover(INDEX, sitemap_filter=SitemapFilter(sitemap_patterns=[r'jobs-2'])))
+    assert listing_ids(entries) == ['100004', '200002']
+
+
+def test_discover_skips_entries_unchanged_since_last_run():
+    since = datetime(2026, 7, 1, tzinfo=timezone.utc)
+    entries = list(discover(INDEX, sitemap_filter=SitemapFilter(since=since)))
+    # jobs-2.xml.gz は lastmod が古いため読み込まず、lastmod のない項目は含める
+    assert listing_ids(entries) == ['100001', '100003', '200001']
+
+
+def test_discover_reports_failed_children_and_continues():
+    failed = []
+    entries = list(discover(BROKEN_INDEX, failed=failed))
+    assert listing_ids(entries) == ['100001', '100002', '100003', '200001']
+    assert [os.path.basename(path) for path in failed] == ['missing.xml']
+
+
+def test_main_does_not_advance_state_when_a_sitemap_fails(tmp_path):
+    state_path = tmp_path / 'state.json'
+    assert main([BROKEN_INDEX, '--state', str(state_path), '-o', str(tmp_path / 'out.jsonl')]) == 1
+    assert not state_path.exists()
+
+    assert main([INDEX, '--state', str(state_path), '-o', str(tmp_path / 'out.jsonl')]) == 0
+    assert json.loads(state_path.read_text())['last_run']
+
+
+def test_main_exits_with_error_when_root_sitemap_cannot_be_read(tmp_path):
+    broken = tmp_path / 'broken.xml'
+    broken.write_text('<urlset><url><loc>https://job-medley.com/ans/1/</loc>')
+    for source in [str(tmp_path / 'missing.xml'), str(broken)]:
+        assert main([source, '--state', str(tmp_path / 'state.json'), '-o', str(tmp_path / 'out.jsonl')]) == 1
+    assert not (tmp_path / 'state.json').exists()
+
+
+def test_main_enqueues_changed_listings_as_detail_tasks(tmp_path):
+    sitemap_dir = tmp_path / 'sitemap'
+    shutil.copytree(FIXTURES, sitemap_dir)
+    index = str(sitemap_dir / 'index.xml')
+    db = str(tmp_path / 'queue.db')
+    state = str(tmp_path / 'state.json')
+    output = tmp_path / 'out.jsonl'
+    assert main([index, '--category', 'ans', '--queue', db, '--state', state, '-o', str(output)]) == 0
+    assert len(output.read_text().splitlines()) == 4
+
+    queue = WorkQueue(db)
+    rows = queue._connect().execute("SELECT kind, url FROM tasks ORDER BY url").fetchall()
+    assert {kind for kind, _ in rows} == {'detail'}
+    assert [url for _, url in rows][0] == 'https://job-medley.com/ans/100001/'
+    assert len(rows) == 4
+
+    # すべて取得し終えた後、100001 だけが更新された
+    while True:
+        task = queue.claim('worker')
+        if task is None:
+            break
+        queue.complete(task, [{'page': 1, 'title': task.url}])
+    for name in ['index.xml', 'jobs-1.xml']:
+        path = sitemap_dir / name
+        text = path.read_text().replace('2026-10-01T00:00:00+09:00', '2099-01-01T00:00:00+09:00')
+        path.write_text(text.replace('2026-09-30T10:00:00+09:00', '2099-01-01T00:00:00+09:00'))
+
+    assert main([index, '--category', 'ans', '--queue', db, '--state', state, '-o', str(output)]) == 0
+    pending = queue._connect().execute("SELECT url FROM tasks WHERE status = 'pending' ORDER BY url").fetchall()
+    queue.close()
+    # lastmod のない 100003 は変更の有無が分からないため取得し直す
+    assert [url for url, in pending] == ['https://job-medley.com/ans/100001/', 'https://job-medley.com/ans/100003/']